@@ -0,0 +1,42 @@
+import json
+import timeit
+
+from utils.json_codec import CODECS, JsonCodec
+from .payloads import build_raw_war, build_raw_clan_members, build_gateway_frames
+
+
+# Usage (from the src directory): python -m benchmarks.json_codec_benchmark
+
+REPEAT = 20
+
+
+def main() -> None:
+    payloads = {
+        'Gateway frames (x200)': [json.dumps(frame) for frame in build_gateway_frames()],
+        'CWL war': [json.dumps(build_raw_war(15, 1))],
+        'Regular war': [json.dumps(build_raw_war(50, 2))],
+        'Clan members': [json.dumps(build_raw_clan_members())],
+    }
+    codecs: list[JsonCodec] = []
+    for codec_class in CODECS.values():
+        try:
+            codecs.append(codec_class())
+        except ImportError:
+            print(f'{codec_class.name} is not installed, skipped')
+
+    for label, documents in payloads.items():
+        decoded_documents = [json.loads(document) for document in documents]
+        print(f'\n{label} ({sum(map(len, documents)) // 1024} KiB)')
+        for codec in codecs:
+            decode_seconds = min(timeit.repeat(
+                lambda: [codec.loads(document) for document in documents], number=REPEAT, repeat=5
+            )) / REPEAT
+            encode_seconds = min(timeit.repeat(
+                lambda: [codec.dumps(document) for document in decoded_documents], number=REPEAT, repeat=5
+            )) / REPEAT
+            timings = f'loads {decode_seconds * 1000:8.3f} ms   dumps {encode_seconds * 1000:8.3f} ms'
+            print(f'  {codec.name.ljust(8)} {timings}')
+
+
+if __name__ == '__main__':
+    main()
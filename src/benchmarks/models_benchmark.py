@@ -0,0 +1,77 @@
+import json
+import timeit
+import tracemalloc
+from typing import Callable
+
+from models.clash_of_clans import War, Player, ClanMember
+from .payloads import build_raw_war, build_raw_player, build_raw_clan_members
+
+
+# Usage (from the src directory): python -m benchmarks.models_benchmark
+
+SNAPSHOTS_COUNT = 100
+REPEAT = 200
+
+
+def read_attacks_summary(war: War) -> None:
+    # What >att needs: member names and attack counts
+    for member in war.clan.members:
+        member.name, member.attacks_count
+
+
+def read_everything(war: War) -> None:
+    for war_clan in (war.clan, war.opponent):
+        for member in war_clan.members:
+            member.best_opponent_attack
+            for attack in member.attacks:
+                attack.stars
+
+
+def bench_decode(label: str, decode: Callable[[], object]) -> None:
+    seconds = min(timeit.repeat(decode, number=REPEAT, repeat=5)) / REPEAT
+    print(f'{label.ljust(40)} {seconds * 1_000_000:10.1f} µs')
+
+
+def bench_memory(label: str, build_snapshot: Callable[[dict], object], body: bytes) -> None:
+    # The payloads are parsed while measuring: the snapshots keep them (War.raw is archived once the war ends)
+    tracemalloc.start()
+    snapshots = [build_snapshot(json.loads(body)) for _ in range(SNAPSHOTS_COUNT)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label.ljust(40)} {size / len(snapshots) / 1024:10.1f} KiB per snapshot')
+
+
+def main() -> None:
+    war_body = json.dumps(build_raw_war()).encode()
+    raw_war = json.loads(war_body)
+    raw_player = build_raw_player()
+    raw_members = build_raw_clan_members()
+
+    print('Decode time (excluding JSON parsing)')
+    bench_decode('War', lambda: War(raw_war))
+    bench_decode('War + >att fields', lambda: read_attacks_summary(War(raw_war)))
+    bench_decode('War + every attack', lambda: read_everything(War(raw_war)))
+    bench_decode('Player', lambda: Player(raw_player))
+    bench_decode('Player + heroes and equipment', lambda: [h.equipment for h in Player(raw_player).heroes])
+    bench_decode('Clan members', lambda: [ClanMember(raw) for raw in raw_members['items']])
+
+    print(f'\nMemory of {SNAPSHOTS_COUNT} war snapshots (including the raw payloads)')
+    bench_memory('Raw payload only', lambda raw: raw, war_body)
+    bench_memory('War', War, war_body)
+
+    def build_read_summary(raw: dict) -> War:
+        war = War(raw)
+        read_attacks_summary(war)
+        return war
+
+    def build_read_everything(raw: dict) -> War:
+        war = War(raw)
+        read_everything(war)
+        return war
+
+    bench_memory('War + >att fields', build_read_summary, war_body)
+    bench_memory('War + every attack', build_read_everything, war_body)
+
+
+if __name__ == '__main__':
+    main()
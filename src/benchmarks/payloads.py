@@ -0,0 +1,147 @@
+import random
+
+
+# Payloads shaped like the ones returned by the CoC and Discord APIs, generated with a fixed seed
+
+def build_raw_war(team_size: int = 50, attacks_per_member: int = 2, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+
+    def build_raw_war_clan(tag: str, opponent_tag: str) -> dict:
+        members: list[dict] = []
+        for position in range(1, team_size + 1):
+            attacks = [
+                {
+                    'attackerTag': f'{tag}{position}',
+                    'defenderTag': f'{opponent_tag}{rng.randint(1, team_size)}',
+                    'stars': rng.randint(0, 3),
+                    'destructionPercentage': rng.randint(0, 100),
+                    'order': rng.randint(1, 2 * team_size * attacks_per_member),
+                    'duration': rng.randint(30, 180)
+                } for _ in range(rng.randint(0, attacks_per_member))
+            ]
+            members.append({
+                'tag': f'{tag}{position}',
+                'name': f'Player {position}',
+                'townhallLevel': rng.randint(10, 17),
+                'mapPosition': position,
+                'attacks': attacks,
+                'opponentAttacks': 1,
+                'bestOpponentAttack': {
+                    'attackerTag': f'{opponent_tag}{rng.randint(1, team_size)}',
+                    'defenderTag': f'{tag}{position}',
+                    'stars': rng.randint(0, 3),
+                    'destructionPercentage': rng.randint(0, 100),
+                    'order': rng.randint(1, 2 * team_size * attacks_per_member),
+                    'duration': rng.randint(30, 180)
+                }
+            })
+        return {
+            'tag': tag,
+            'name': f'Clan {tag}',
+            'badgeUrls': {'small': 'https://api-assets.clashofclans.com/badges/70/x.png'},
+            'clanLevel': 20,
+            'attacks': sum(len(m['attacks']) for m in members),
+            'stars': sum(sum(a['stars'] for a in m['attacks']) for m in members),
+            'destructionPercentage': rng.uniform(0, 100),
+            'expEarned': 0,
+            'members': members
+        }
+
+    return {
+        'state': 'inWar',
+        'teamSize': team_size,
+        'attacksPerMember': attacks_per_member,
+        'battleModifier': 'none',
+        'preparationStartTime': '20250707T133325.000Z',
+        'startTime': '20250708T133325.000Z',
+        'endTime': '20250709T133325.000Z',
+        'clan': build_raw_war_clan('#CLAN', '#OPPONENT'),
+        'opponent': build_raw_war_clan('#OPPONENT', '#CLAN')
+    }
+
+
+def build_raw_player(seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    troop_names = ['Barbarian', 'Archer', 'Giant', 'Goblin', 'Wall Breaker', 'Balloon', 'Wizard', 'Healer', 'Dragon',
+                   'P.E.K.K.A', 'Baby Dragon', 'Miner', 'Electro Dragon', 'Yeti', 'Dragon Rider', 'Electro Titan',
+                   'Root Rider', 'Thrower', 'Minion', 'Hog Rider', 'Valkyrie', 'Golem', 'Witch', 'Lava Hound',
+                   'Bowler', 'Ice Golem', 'Headhunter', 'Apprentice Warden', 'Druid', 'Furnace']
+    pet_names = ['L.A.S.S.I', 'Mighty Yak', 'Electro Owl', 'Unicorn', 'Phoenix', 'Poison Lizard', 'Diggy', 'Frosty',
+                 'Spirit Fox', 'Angry Jelly']
+    return {
+        'tag': '#PLAYER',
+        'name': 'Player',
+        'troops': [
+            {'name': name, 'level': rng.randint(1, 10), 'maxLevel': 10, 'village': 'home'}
+            for name in troop_names + pet_names
+        ],
+        'heroes': [
+            {
+                'name': name,
+                'level': rng.randint(1, 100),
+                'maxLevel': 100,
+                'village': 'home',
+                'equipment': [{'name': f'{name} equipment {i}', 'level': rng.randint(1, 27), 'maxLevel': 27}
+                              for i in range(2)]
+            } for name in ('Barbarian King', 'Archer Queen', 'Grand Warden', 'Royal Champion', 'Minion Prince')
+        ]
+    }
+
+
+def build_raw_clan_members(members_count: int = 50, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    return {
+        'items': [
+            {
+                'tag': f'#MEMBER{i}',
+                'name': f'Member {i}',
+                'role': rng.choice(['member', 'admin', 'coLeader', 'leader']),
+                'townHallLevel': rng.randint(10, 17),
+                'expLevel': rng.randint(100, 300),
+                'donations': rng.randint(0, 5000),
+                'donationsReceived': rng.randint(0, 5000),
+                'trophies': rng.randint(2000, 6000),
+                'builderBaseTrophies': rng.randint(2000, 6000)
+            } for i in range(members_count)
+        ]
+    }
+
+
+def build_gateway_frames(seed: int = 0) -> list[dict]:
+    # A mix of the frames received by a bot sitting in busy guilds, most of them are ignored by the bot
+    rng = random.Random(seed)
+    author = {'id': '80351110224678912', 'username': 'member', 'global_name': 'Member', 'avatar': 'a' * 32}
+    message = {
+        'id': '1394456649170812939',
+        'channel_id': '1327513254473236481',
+        'guild_id': '1327513254473236480',
+        'type': 0,
+        'content': 'Anyone up for a friendly challenge? ' * 3,
+        'author': author,
+        'member': {'roles': ['1327513254473236482'], 'joined_at': '2025-01-01T00:00:00+00:00', 'nick': None},
+        'timestamp': '2025-07-08T13:33:25.000000+00:00',
+        'mentions': [],
+        'attachments': [],
+        'embeds': [],
+        'flags': 0
+    }
+    presence = {
+        'user': {'id': author['id']},
+        'guild_id': message['guild_id'],
+        'status': 'online',
+        'activities': [{'name': 'Clash of Clans', 'type': 0, 'created_at': 1752068005000}],
+        'client_status': {'mobile': 'online'}
+    }
+    typing = {'channel_id': message['channel_id'], 'guild_id': message['guild_id'], 'user_id': author['id'],
+              'timestamp': 1752068005}
+    frames = []
+    for sequence_number in range(1, 201):
+        event_name, data = rng.choice([
+            ('MESSAGE_CREATE', message),
+            ('PRESENCE_UPDATE', presence),
+            ('PRESENCE_UPDATE', presence),
+            ('TYPING_START', typing),
+            ('MESSAGE_UPDATE', message)
+        ])
+        frames.append({'op': 0, 't': event_name, 's': sequence_number, 'd': data})
+    return frames
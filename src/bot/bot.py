@@ -7,16 +7,23 @@ import re
 from typing import Optional
 from dotenv import load_dotenv
 
-from models.clash_of_clans import ClanRole, War, WarClan, WarParticipant, CapitalRaidSeason
+from models.clash_of_clans import ClanMember, ClanRole, War, WarClan, WarParticipant, CapitalRaidSeason
 from models.discord import Message, ChannelType, User, PresenceActivity
-from clients import DiscordGatewayClient, ClashOfClansApiClient, DiscordApiClient
-from repositories import CommandUsesRepository, DiscordCocLinksRepository, TroopGiversRepository, WhitelistsRepository
-from services import ClanMembersService, ClanWarsService, CapitalRaidsService
+from clients import (
+    DiscordGatewayClient, ClashOfClansApiClient, DiscordApiClient, IdentifyLimiter, create_background_task
+)
+from repositories import (
+    CommandUsesRepository, DiscordCocLinksRepository, TroopGiversRepository, WhitelistsRepository, WriteBehindQueue,
+    run_migrations
+)
+from services import ClanMembersService, ClanWarsService, CapitalRaidsService, ClanRoleIndex
 from i18n import __
 from utils import to_timestamp, parse_year_month, log, LogLevel
 
-from .custom_pings import parse_custom_ping
+from .custom_pings import MembersSnapshot, find_custom_pings
 from .commands import Command, requires_role
+from .presence_manager import PresenceManager
+from .shard_coordinator import ShardCoordinator
 
 
 APP_NAME = 'coc-bot'
@@ -50,6 +57,9 @@ WEEKEND_RAID_APPLICATION_ID = '1394592567105949777'
 
 load_dotenv()
 BACKOFFICE_CHANNEL_ID = os.environ.get('BACKOFFICE_CHANNEL_ID')
+GATEWAY_COMPRESSION = os.environ.get('GATEWAY_COMPRESSION', '0') == '1'
+GATEWAY_SESSION_FILE_PREFIX = '.coc-bot-session'
+IDENTIFY_LOCK_FILE_PREFIX = '.coc-bot-identify-'
 
 
 class Bot:
@@ -59,28 +69,47 @@ class Bot:
         discord_auth_token: str,
         coc_api_token: str,
         prefix = '>',
-        secondary_clan_tag: Optional[str] = None
+        secondary_clan_tag: Optional[str] = None,
+        shard_ids: Optional[list[int]] = None,
+        shard_count: int = 1
     ) -> None:
-        self.discord_coc_links_repository = DiscordCocLinksRepository()
+        self.clan_role_index = ClanRoleIndex()
+        self.discord_coc_links_repository = DiscordCocLinksRepository(on_link_insert=self.clan_role_index.add_link)
         self.command_uses_repository = CommandUsesRepository()
         self.troop_givers_repository = TroopGiversRepository()
         self.whitelists_repository = WhitelistsRepository()
 
         self.discord_api_client = DiscordApiClient(discord_auth_token)
-        self.discord_gateway_client = DiscordGatewayClient(
-            APP_NAME,
-            discord_auth_token,
-            on_ready=self.on_ready,
-            on_message=self.on_message,
+        self.discord_auth_token = discord_auth_token
+        self.shard_coordinator = ShardCoordinator(
+            list(range(shard_count)) if shard_ids is None else shard_ids,
+            shard_count,
             on_error=self.on_error
         )
+        # Shards of other processes identify through the same lock files
+        self.identify_limiter = IdentifyLimiter(lock_file_prefix=IDENTIFY_LOCK_FILE_PREFIX if shard_count > 1 else None)
+        for shard_id in self.shard_coordinator.shard_ids:
+            self.shard_coordinator.add_gateway_client(shard_id, DiscordGatewayClient(
+                APP_NAME,
+                discord_auth_token,
+                on_ready=self.on_ready,
+                on_resumed=self.on_resumed,
+                on_message=self.on_message,
+                on_error=self.on_error,
+                compress=GATEWAY_COMPRESSION,
+                message_prefix=prefix,
+                session_file=f'{GATEWAY_SESSION_FILE_PREFIX}{f'-{shard_id}' if shard_count > 1 else ''}.json',
+                shard=(shard_id, shard_count) if shard_count > 1 else None,
+                identify_limiter=self.identify_limiter
+            ))
         self.coc_api_client = ClashOfClansApiClient(coc_api_token)
         self.clan_tag = clan_tag
         self.clan_invite_link = f'https://link.clashofclans.com/fr?action=OpenClanProfile&tag={clan_tag}'
         self.secondary_clan_tag = secondary_clan_tag
         self.prefix = prefix
         self.can_use_custom_emojis = False
-        self.activities: dict[str, Optional[PresenceActivity]] = {}
+        self.presence_manager = PresenceManager(self.shard_coordinator.update_presence)
+        self.ready_shard_ids: set[int] = set()
 
         # Wars
         self.clan_wars_service = ClanWarsService(
@@ -105,15 +134,24 @@ class Bot:
         )
 
         # Clan members
-        self.clan_members_service = ClanMembersService(self.clan_tag, self.coc_api_client, self.discord_api_client)
+        self.clan_members_service = ClanMembersService(
+            self.clan_tag,
+            self.coc_api_client,
+            self.discord_api_client,
+            self.on_clan_members_change
+        )
         self.secondary_clan_members_service = None
         if self.secondary_clan_tag is not None:
             self.secondary_clan_members_service = ClanMembersService(
                 self.secondary_clan_tag,
                 self.coc_api_client,
-                self.discord_api_client
+                self.discord_api_client,
+                self.on_clan_members_change
             )
 
+        # Every table exists once the repositories and services are created
+        run_migrations()
+
         commands = [
             Command('claninfo', self.clan_info, aliases=['clan']),
 
@@ -147,35 +185,52 @@ class Bot:
 
     async def run(self) -> None:
         self.started_at = time()
-        await self.discord_gateway_client.run()
+        await self.configure_sharding()
+        self.clan_role_index.set_links(await self.discord_coc_links_repository.get_links())
+        self.shard_coordinator.start()
+        try:
+            await self.shard_coordinator.run()
+        finally:
+            await self.shard_coordinator.stop()
+            await WriteBehindQueue().close()
+            await self.coc_api_client.close()
+            await self.discord_api_client.close()
+
+    async def configure_sharding(self) -> None:
+        if not self.discord_auth_token.startswith('Bot '):
+            return
+        gateway_bot = await self.discord_api_client.get_gateway_bot()
+        if gateway_bot is None:
+            return
+        self.identify_limiter.max_concurrency = gateway_bot['session_start_limit']['max_concurrency']
+        if gateway_bot['shards'] > self.shard_coordinator.shard_count:
+            log(f'Discord recommends {gateway_bot['shards']} shards', LogLevel.WARNING)
+
+    async def on_clan_members_change(self, clan_tag: str, clan_members: list[ClanMember]):
+        self.clan_role_index.update_clan_members(clan_tag, clan_members)
+
+    async def refresh_clan_role_index(self) -> None:
+        clan_members_services = [self.clan_members_service]
+        if self.secondary_clan_members_service is not None:
+            clan_members_services.append(self.secondary_clan_members_service)
+        clan_tags = [service.clan_tag for service in clan_members_services]
+        if not self.clan_role_index.is_fresh(clan_tags):
+            self.clan_role_index.set_links(await self.discord_coc_links_repository.get_links())
+            await asyncio.gather(*[service.get_clan_members() for service in clan_members_services])
 
     async def on_current_war_change(self, war: War):
-        # TODO: should be done async to not block return
-        self.activities['WAR'] = war.build_presence_activity()
+        self.presence_manager.set_activity('WAR', war.build_presence_activity())
         if war.is_cwl:
-            self.activities['CWL'] = war.build_cwl_presence_activity()
-        await self.update_presence()
+            self.presence_manager.set_activity('CWL', war.build_cwl_presence_activity())
 
     async def on_current_raid_change(self, capital_raid_season: CapitalRaidSeason):
-        # TODO: should be done async to not block return
         if capital_raid_season.state == 'ongoing':
-            self.activities['RAID'] = capital_raid_season.build_presence_activity()
-            await self.update_presence()
+            self.presence_manager.set_activity('RAID', capital_raid_season.build_presence_activity())
 
     async def get_current_capital_raid_season(self) -> Optional[CapitalRaidSeason]:
         capital_raid_season = await self.capital_raids_service.get_current_capital_raid_season()
         return capital_raid_season
 
-    async def update_presence(self) -> None:
-        ACTIVITIES_ORDER = ('WAR', 'CWL', 'RAID', 'CLAN')
-        await self.discord_gateway_client.update_presence([])
-        await self.discord_gateway_client.update_presence([
-            activity for activity in map(
-                lambda a: a[1],
-                sorted(self.activities.items(), key = lambda a: ACTIVITIES_ORDER.index(a[0]))
-            ) if activity is not None
-        ])
-
     def get_clan_wars_service(self, command_params):
         clan_wars_service = self.clan_wars_service
         if len(command_params) > 0 and command_params[0].isdigit() and int(command_params[0]) == 2:
@@ -191,7 +246,7 @@ class Bot:
         )
 
     async def whitelist_channel(self, message: Message) -> None:
-        self.whitelists_repository.insert_whitelist(message.channel_id, 'CHANNEL')
+        await self.whitelists_repository.insert_whitelist(message.channel_id, 'CHANNEL')
         info_message = __('Channel added to whitelist')
         await self.discord_api_client.send_message(message.channel_id, f':white_check_mark: {info_message}')
 
@@ -199,13 +254,13 @@ class Bot:
         if message.guild_id is None:
             log(f'Aborted whitelist_guild command, message has no guild ID.', LogLevel.INFO)
             return
-        self.whitelists_repository.insert_whitelist(message.guild_id, 'GUILD')
+        await self.whitelists_repository.insert_whitelist(message.guild_id, 'GUILD')
         info_message = __('Server added to whitelist')
         await self.discord_api_client.send_message(message.channel_id, f':white_check_mark: {info_message}')
 
     @requires_role(ClanRole.MEMBER)
     async def troops(self, message: Message):
-        troop_givers: list[tuple[str, str]] = self.troop_givers_repository.get_pingable_troop_givers()
+        troop_givers: list[tuple[str, str]] = await self.troop_givers_repository.get_pingable_troop_givers()
         params = message.content.split()[1:]
         if len(params) > 0:
             match = re.match("((hdv)|(th))?(\\d{1,2})", params[0])
@@ -214,8 +269,8 @@ class Bot:
                 eligible_members = await self.clan_members_service.get_clan_members(
                     lambda m: m.townhall_level >= min_townhall
                 )
-                eligible_player_tags = list(map(lambda m: m.tag, eligible_members))
-                troop_givers = list(filter(lambda g: g[1] in eligible_player_tags, troop_givers))
+                eligible_player_tags = {m.tag for m in eligible_members}
+                troop_givers = [g for g in troop_givers if g[1] in eligible_player_tags]
 
         snowflakes = list(set(troop_giver[0] for troop_giver in troop_givers))
         if len(snowflakes) == 0:
@@ -242,9 +297,10 @@ class Bot:
             )
             return
         added_troop_givers = []
+        linked_discord_ids = await self.discord_coc_links_repository.get_linked_discord_ids(params)
         for param in params:
-            if len(self.discord_coc_links_repository.get_player_tags_from_discord_id(param)) > 0:
-                self.troop_givers_repository.insert_troop_giver(param, True)
+            if param in linked_discord_ids:
+                await self.troop_givers_repository.insert_troop_giver(param, True)
                 added_troop_givers.append(param)
         if len(added_troop_givers) == 0:
             message_content = __('None of the given IDs is linked to the COC account of a member of the clan')
@@ -262,9 +318,10 @@ class Bot:
                 __('Usage: `%1 <Discord-User-ID>`', f'{self.prefix}removetroopgiver')
             )
         removed_troop_givers = []
+        linked_discord_ids = await self.discord_coc_links_repository.get_linked_discord_ids(params)
         for param in params:
-            if len(self.discord_coc_links_repository.get_player_tags_from_discord_id(param)) > 0:
-                self.troop_givers_repository.insert_troop_giver(param, False)
+            if param in linked_discord_ids:
+                await self.troop_givers_repository.insert_troop_giver(param, False)
                 removed_troop_givers.append(param)
         if len(removed_troop_givers) == 0:
             message_content = __('None of the given IDs is linked to the COC account of a member of the clan')
@@ -343,9 +400,7 @@ class Bot:
         league_group = await clan_wars_service.get_current_cwl_group()
         if spyed_day <= len(league_group.rounds):
             for war_tag in league_group.rounds[spyed_day - 1].war_tags:
-                fetched_war = clan_wars_service.ended_cwl_wars.get(war_tag)
-                if fetched_war is None:
-                    fetched_war = await self.coc_api_client.get_cwl_war(war_tag)
+                fetched_war = await clan_wars_service.get_cwl_war(war_tag, spyed_day)
                 if fetched_war is None:
                     log(
                         f'Failed to find CWL war in which the linked clan participates for day {spyed_day}',
@@ -410,37 +465,29 @@ class Bot:
         rest = message.content.strip()[message.content.index(' ') + 1:].strip()
         if len(rest) == 0:
             return
-        potential_ping_indices = [i for i, c in enumerate(rest) if c == '@']
-        potential_ping_indices.reverse()
-        filters = []
-        for potential_ping_index in potential_ping_indices:
-            custom_ping_filter = parse_custom_ping(rest[potential_ping_index:])
-            if custom_ping_filter is None:
-                continue
-            end_index = potential_ping_index + 1  # TODO: obviously shouldn't recompute that
-            while len(rest) > end_index and (rest[end_index].isalnum() or rest[end_index] in '+-|&'):
-                end_index += 1
-            rest = rest[:potential_ping_index] + '**`' + rest[potential_ping_index:end_index] + '`**' + rest[end_index:]
-            filters.append(custom_ping_filter)
-
-        def combined_filter(m):
-            for f in filters:
-                if f(m):
-                    return True
-            return False
-
-        members = await self.clan_members_service.get_clan_members(combined_filter)
+        custom_pings = find_custom_pings(rest)
+        announcement_parts = []
+        previous_end = 0
+        for start, end, _ in custom_pings:
+            announcement_parts += [rest[previous_end:start], '**`', rest[start:end], '`**']
+            previous_end = end
+        announcement_parts.append(rest[previous_end:])
+        announcement = ''.join(announcement_parts)
+
+        members_snapshot = MembersSnapshot(await self.clan_members_service.get_clan_members())
+        members = members_snapshot.match([custom_ping for _, _, custom_ping in custom_pings])
+        discord_ids = await self.discord_coc_links_repository.get_discord_ids_from_player_tags([m.tag for m in members])
         discord_mentions = []
         plain_coc_nicknames = []
         for member in members:
-            discord_id = self.discord_coc_links_repository.get_discord_id_from_player_tag(member.tag)
+            discord_id = discord_ids.get(member.tag)
             if discord_id is not None:
                 discord_mentions.append(f'<@{discord_id}>')
             else:
                 plain_coc_nicknames.append(f'`{member.name}`')
         mentions = plain_coc_nicknames + discord_mentions
         pings = (f'\n**{__('Mentions:')}**\n||' + '** ; **'.join(mentions) + '||') if len(mentions) else ''
-        await self.discord_api_client.send_message(message.channel_id, f'{rest}\n{pings}')
+        await self.discord_api_client.send_message(message.channel_id, f'{announcement}\n{pings}')
 
     @requires_role(ClanRole.MEMBER)
     async def attacks(self, message: Message):
@@ -451,7 +498,7 @@ class Bot:
             missing_attacks = [
                 m.missing_attacks_str(current_war.attacks_per_member, self.can_use_custom_emojis, True)
                 for m in current_war.clan.members
-                if len(m.attacks) <current_war.attacks_per_member
+                if m.attacks_count < current_war.attacks_per_member
             ]
             missing_attacks_str = f'**{__('Remaining attacks')}:**\n' + '\n'.join(missing_attacks)
             missing_attacks_str += f'\n\n_{__('War end: %1', f'<t:{to_timestamp(current_war.end_time)}:R>')}_'
@@ -486,20 +533,30 @@ class Bot:
                 can_run_command = self.whitelists_repository.is_whitelisted(message.channel_id, message.guild_id)
             if can_run_command:
                 self.command_uses_repository.insert_command_use(message.author.id, command.name)
-                await command.func(message)
+                self.shard_coordinator.dispatch(command.func, message)
 
     async def on_ready(self, data: dict):
+        self.ready_shard_ids.add(data.get('shard', [0])[0])
         self.user = User(data['user'])
         self.can_use_custom_emojis = self.user.is_bot or self.user.has_nitro
-        self.activities['CLAN'] = PresenceActivity(
+        self.presence_manager.invalidate()
+        self.presence_manager.set_activity('CLAN', PresenceActivity(
             'The 3200 Club',  # TODO: fetch clan info
             0,
             self.clan_tag,
             application_id = CLAN_APPLICATION_ID
-        )
-        await self.clan_wars_service.get_current_war()
+        ))
+        if data.get('shard', [0])[0] != self.shard_coordinator.shard_ids[0]:
+            return  # Wars are fetched once per process
+        # Not awaited to keep reading gateway messages meanwhile
+        create_background_task(self.clan_wars_service.get_current_war())
         if self.secondary_clan_wars_service is not None:
-            await self.secondary_clan_wars_service.get_current_war()
+            create_background_task(self.secondary_clan_wars_service.get_current_war())
+
+    async def on_resumed(self, data: dict):
+        # A restarted process that resumed its saved session gets no READY: it is set up the same way
+        if data.get('shard', [0])[0] not in self.ready_shard_ids:
+            await self.on_ready(data)
 
     async def on_error(self, e: Exception):
         content = f'**:warning: ERROR**\n```\n{traceback.format_exc()}```'
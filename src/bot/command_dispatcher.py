@@ -0,0 +1,74 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from models.discord import Message
+from utils import log, LogLevel
+
+
+DEFAULT_WORKERS_COUNT = 8
+DEFAULT_MAX_COMMANDS_PER_USER = 2
+DEFAULT_QUEUE_SIZE = 100
+DEFAULT_COMMAND_TIMEOUT = 60  # seconds
+
+
+class CommandDispatcher:
+    def __init__(
+        self,
+        workers_count: int = DEFAULT_WORKERS_COUNT,
+        max_commands_per_user: int = DEFAULT_MAX_COMMANDS_PER_USER,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        timeout: float = DEFAULT_COMMAND_TIMEOUT,
+        on_error: Optional[Callable[[Exception], Awaitable[None]]] = None
+    ) -> None:
+        self.workers_count = workers_count
+        self.max_commands_per_user = max_commands_per_user
+        self.timeout = timeout
+        self.on_error = on_error
+        self.queue: asyncio.Queue[tuple[Callable[[Message], Awaitable[None]], Message]] = asyncio.Queue(queue_size)
+        self.commands_per_user: dict[str, int] = {}  # Queued or running commands of each user
+        self.workers: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        if len(self.workers) == 0:
+            self.workers = [asyncio.create_task(self.work()) for _ in range(self.workers_count)]
+
+    async def stop(self) -> None:
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def dispatch(self, func: Callable[[Message], Awaitable[None]], message: Message) -> bool:
+        # Never blocks: the gateway receive loop calls it
+        user_id = message.author.id
+        if self.commands_per_user.get(user_id, 0) >= self.max_commands_per_user:
+            log(f'Ignored command of {message.author}: too many commands in progress', LogLevel.INFO)
+            return False
+        try:
+            self.queue.put_nowait((func, message))
+        except asyncio.QueueFull:
+            log(f'Ignored command of {message.author}: command queue is full', LogLevel.WARNING)
+            return False
+        self.commands_per_user[user_id] = self.commands_per_user.get(user_id, 0) + 1
+        return True
+
+    async def work(self) -> None:
+        while True:
+            func, message = await self.queue.get()
+            try:
+                await asyncio.wait_for(func(message), self.timeout)
+            except asyncio.TimeoutError:
+                log(f'Command `{message.content}` timed out after {self.timeout}s', LogLevel.WARNING)
+            except Exception as e:
+                if self.on_error is None:
+                    log(f'Command `{message.content}` failed: {e}', LogLevel.ERROR)
+                    continue
+                try:
+                    await self.on_error(e)
+                except Exception as on_error_exception:
+                    log(f'Failed to report command error: {on_error_exception}', LogLevel.ERROR)
+            finally:
+                self.commands_per_user[message.author.id] -= 1
+                if self.commands_per_user[message.author.id] == 0:
+                    del self.commands_per_user[message.author.id]
+                self.queue.task_done()
@@ -20,27 +20,13 @@ def requires_role(role: ClanRole = ClanRole.NOT_MEMBER):
         @wraps(func)
         async def wrapper(self, message):
             if role != ClanRole.NOT_MEMBER:
-                player_tags = self.discord_coc_links_repository.get_player_tags_from_discord_id(message.author.id)
-                clan_members = await self.clan_members_service.get_clan_members(lambda m: m.role.value >= role.value)
-                eligible_members = sorted(
-                    (m for m in clan_members if m.tag in player_tags),
-                    key=lambda m: m.role.value,
-                    reverse=True
-                )
-                if len(eligible_members) == 0:
-                    clan_members = await self.secondary_clan_members_service.get_clan_members(
-                        lambda m: m.role.value >= role.value
-                    )
-                    eligible_members = sorted(
-                        (m for m in clan_members if m.tag in player_tags),
-                        key=lambda m: m.role.value,
-                        reverse=True
-                    )
-
-                if len(eligible_members) == 0:
+                # Highest role among the linked accounts, from the index kept up to date by the clan members services
+                await self.refresh_clan_role_index()
+                member = self.clan_role_index.get_highest_member(message.author.id)
+                if member is None or member.role.value < role.value:
                     log('No eligible clan member found for the Discord account that ran the command', LogLevel.INFO)
                     return
-                log(f'Player {eligible_members[0].name} ({eligible_members[0].role.name}) eligible', LogLevel.INFO)
+                log(f'Player {member.name} ({member.role.name}) eligible', LogLevel.INFO)
             await func(self, message)
         return wrapper
     return decorator
@@ -1,79 +1,126 @@
+import operator
+from functools import lru_cache
 from typing import Callable, Optional
 from models.clash_of_clans import ClanRole, ClanMember
 
 
-def parse_custom_ping(custom_ping_started_string: str) -> Optional[Callable[[ClanMember], bool]]:
-    # custom_ping_started_string format: @th16&chef|th11-&adj and then anything after that
-    if len(custom_ping_started_string) == 0 or custom_ping_started_string[0] != '@':
-        return None
+PING_OPERATORS = '|&'
+PING_MODIFIERS = '+-'
+ROLE_KEYWORDS = {
+    'chef': ClanRole.LEADER,
+    **{k: ClanRole.COLEADER for k in ('adj', 'adjoint', 'adjs', 'adjoints')},
+    **{k: ClanRole.ADMIN for k in ('aine', 'ainé', 'aîné', 'aines', 'ainés', 'aînés')},
+    **{k: ClanRole.MEMBER for k in ('membre', 'membres')},
+}
+COMPARATORS = {'+': operator.ge, '-': operator.le, None: operator.eq}
+
+Mask = list[bool]
+CompiledPing = Callable[['MembersSnapshot'], Mask]
+
+
+class MembersSnapshot:
+    # Clan members by column, so that each part of a custom ping goes through a single attribute at once
+    def __init__(self, members: list[ClanMember]) -> None:
+        self.members = members
+        self.roles = [m.role.value for m in members]
+        self.townhall_levels = [m.townhall_level for m in members]
+
+    def match(self, custom_pings: list[CompiledPing]) -> list[ClanMember]:
+        # Members matched by any of the custom pings
+        selected = [False] * len(self.members)
+        for custom_ping in custom_pings:
+            selected = [s or m for s, m in zip(selected, custom_ping(self))]
+        return [member for member, is_selected in zip(self.members, selected) if is_selected]
+
+
+class PingTerm:
+    def __init__(self, keyword: str, modifier: Optional[str] = None) -> None:
+        self.keyword = keyword
+        self.modifier = modifier  # '+' for this rank and above, '-' for this rank and below
+
+
+class PingOperation:
+    def __init__(self, operator: str, operands: list) -> None:
+        self.operator = operator
+        self.operands = operands
+
 
-    operations: list[str] = []
-    operands: list[Callable[[ClanMember], bool]] = []
-    keyword_acc = ''
+def is_custom_ping_char(char: str) -> bool:
+    return char.isalnum() or char in PING_OPERATORS or char in PING_MODIFIERS
+
+
+def parse_custom_ping(expression: str) -> Optional[PingTerm | PingOperation]:
+    # expression format: th16&chef|th11-&adj, & has precedence over |
+    or_operands: list[list[PingTerm]] = []
+    and_operands: list[PingTerm] = []
+    keyword = ''
     expect_keyword = True
-    for char in custom_ping_started_string[1:]:
-        if char not in '+-|&' and not char.isalnum():
-            break
-        if expect_keyword == (char in '+-|&') and keyword_acc == '':
-            return None
+    for char in expression:
         if char.isalnum():
-            keyword_acc += char
-        else:
-            if len(keyword_acc) > 0:
-                operands.append(get_custom_ping_filter(keyword_acc, char))
-                keyword_acc = ''
-            if char in '|&' and len(operands) > 0:
-                operations.append(char)
-                expect_keyword = True
-            elif char in '+-':
-                expect_keyword = False
-    if len(keyword_acc) > 0:
-        operands.append(get_custom_ping_filter(keyword_acc))
-    while len(operands) > 1:
-        operand_1 = operands.pop()
-        operand_2 = operands.pop()
-        operation = operations.pop()
-        if operation == '&':
-            operands.append(lambda m: operand_2(m) and operand_1(m))
-        elif operation == '|':
-            operands.append(lambda m: operand_2(m) or operand_1(m))
+            if not expect_keyword:
+                return None  # Keyword right after a modifier
+            keyword += char
+            continue
+        if len(keyword) > 0:
+            and_operands.append(PingTerm(keyword, char if char in PING_MODIFIERS else None))
+            keyword = ''
+        elif expect_keyword:
+            return None  # Operator or modifier without keyword
+        expect_keyword = char in PING_OPERATORS
+        if char == '|':
+            or_operands.append(and_operands)
+            and_operands = []
+    if len(keyword) > 0:
+        and_operands.append(PingTerm(keyword))
+    operands: list = [
+        group[0] if len(group) == 1 else PingOperation('&', group)
+        for group in or_operands + [and_operands] if len(group) > 0
+    ]
     if len(operands) == 0:
         return None
-    return operands[0]
-
-
-def get_custom_ping_filter(base_keyword: str, modifier: Optional[str] = None) -> Callable[[ClanMember], bool]:
-    clan_role_base = None
-    if len(base_keyword) == 0:
-        return lambda _: False
-    if base_keyword == 'clan':
-        return lambda _: True
-    if base_keyword == 'chef':
-        clan_role_base = ClanRole.LEADER
-    elif base_keyword in ('adj', 'adjoint', 'adjs', 'adjoints'):
-        clan_role_base = ClanRole.COLEADER
-    elif base_keyword in ('aine', 'ainé', 'aîné', 'aines', 'ainés', 'aînés'):
-        clan_role_base = ClanRole.ADMIN
-    elif base_keyword in ('membre', 'membres'):
-        clan_role_base = ClanRole.MEMBER
-    elif base_keyword in ('gdc', 'gdcattack', 'attack'):
-        return lambda _: False  # TODO
-    elif base_keyword.startswith('th') or base_keyword.startswith('hdv'):
-        th_level_str = base_keyword[2 if base_keyword.startswith('th') else 3:]
-        if not th_level_str.isdigit():
-            return lambda _: False
-        th_level = int(th_level_str)
-        if modifier == '+':
-            return lambda m: m.townhall_level >= th_level
-        elif modifier == '-':
-            return lambda m: m.townhall_level <= th_level
-        return lambda m: m.townhall_level == th_level
-
-    if clan_role_base is not None:
-        if modifier == '+':
-            return lambda m: m.role.value >= clan_role_base.value
-        elif modifier == '-':
-            return lambda m: m.role.value <= clan_role_base.value
-        return lambda m: m.role == clan_role_base
-
-    return lambda _: False
+    return operands[0] if len(operands) == 1 else PingOperation('|', operands)
+
+
+def compile_ping_term(term: PingTerm) -> CompiledPing:
+    if term.keyword == 'clan':
+        return lambda s: [True] * len(s.members)
+    compare = COMPARATORS[term.modifier]
+    role = ROLE_KEYWORDS.get(term.keyword)
+    if role is not None:
+        return lambda s: [compare(r, role.value) for r in s.roles]
+    if term.keyword.startswith('th') or term.keyword.startswith('hdv'):
+        th_level_str = term.keyword[2 if term.keyword.startswith('th') else 3:]
+        if th_level_str.isdigit():
+            th_level = int(th_level_str)
+            return lambda s: [compare(t, th_level) for t in s.townhall_levels]
+    # Unknown keywords, and gdc / gdcattack / attack (TODO), match nobody
+    return lambda s: [False] * len(s.members)
+
+
+def compile_ping_node(node: PingTerm | PingOperation) -> CompiledPing:
+    if isinstance(node, PingTerm):
+        return compile_ping_term(node)
+    operands = [compile_ping_node(operand) for operand in node.operands]
+    combine = all if node.operator == '&' else any
+    return lambda s: [combine(values) for values in zip(*[operand(s) for operand in operands])]
+
+
+@lru_cache(maxsize=256)
+def compile_custom_ping(expression: str) -> Optional[CompiledPing]:
+    node = parse_custom_ping(expression)
+    return None if node is None else compile_ping_node(node)
+
+
+def find_custom_pings(text: str) -> list[tuple[int, int, CompiledPing]]:
+    # (start, end, compiled ping) of each valid custom ping, in a single pass: pings can't contain '@'
+    custom_pings = []
+    start = text.find('@')
+    while start >= 0:
+        end = start + 1
+        while end < len(text) and is_custom_ping_char(text[end]):
+            end += 1
+        custom_ping = compile_custom_ping(text[start + 1:end])
+        if custom_ping is not None:
+            custom_pings.append((start, end, custom_ping))
+        start = text.find('@', end)
+    return custom_pings
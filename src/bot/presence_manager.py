@@ -0,0 +1,63 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from models.discord import PresenceActivity
+
+
+PRESENCE_DEBOUNCE_DELAY = 2  # seconds
+ACTIVITIES_ORDER = ('WAR', 'CWL', 'RAID', 'CLAN')
+
+
+class PresenceManager:
+    # Changes are applied right away but sent later, all at once, and only if the visible presence changed
+    def __init__(
+        self,
+        send_presence: Callable[[list[PresenceActivity]], Awaitable[None]],
+        debounce_delay: float = PRESENCE_DEBOUNCE_DELAY
+    ) -> None:
+        self.send_presence = send_presence
+        self.debounce_delay = debounce_delay
+        self.activities: dict[str, Optional[PresenceActivity]] = {}
+        self.last_sent_activities: Optional[list[dict]] = None
+        self.scheduled_update: Optional[asyncio.TimerHandle] = None
+        self.update_task: Optional[asyncio.Task] = None  # Referenced so that it isn't garbage collected while sending
+        self.sent_updates = 0
+        self.skipped_updates = 0
+
+    def set_activity(self, key: str, activity: Optional[PresenceActivity]) -> None:
+        self.activities[key] = activity
+        self.schedule_update()
+
+    def invalidate(self) -> None:
+        # After an identify, Discord no longer shows what was sent before
+        self.last_sent_activities = None
+        self.schedule_update()
+
+    def schedule_update(self) -> None:
+        # Never blocks the caller, the changes made until the update is sent are sent with it
+        if self.scheduled_update is None:
+            event_loop = asyncio.get_event_loop()
+            self.scheduled_update = event_loop.call_later(self.debounce_delay, self.create_update_task)
+
+    def get_presence_activities(self) -> list[PresenceActivity]:
+        return [
+            activity for _, activity in sorted(self.activities.items(), key = lambda a: ACTIVITIES_ORDER.index(a[0]))
+            if activity is not None and activity.enabled
+        ]
+
+    def create_update_task(self) -> None:
+        self.scheduled_update = None
+        if self.update_task is not None and not self.update_task.done():
+            self.schedule_update()  # One update at a time: tried again after the delay
+            return
+        self.update_task = asyncio.create_task(self.update())
+
+    async def update(self) -> None:
+        presence_activities = self.get_presence_activities()
+        serialized_activities = [activity.to_dict() for activity in presence_activities]
+        if serialized_activities == self.last_sent_activities:
+            self.skipped_updates += 1
+            return
+        self.last_sent_activities = serialized_activities
+        self.sent_updates += 1
+        await self.send_presence(presence_activities)
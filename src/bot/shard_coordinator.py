@@ -0,0 +1,59 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from clients import DiscordGatewayClient
+from models.discord import Message, PresenceActivity
+from utils import log, LogLevel
+
+from .command_dispatcher import CommandDispatcher
+
+
+def get_shard_id(guild_id: Optional[str], shard_count: int) -> int:
+    # DMs are only sent to shard 0
+    if guild_id is None:
+        return 0
+    return (int(guild_id) >> 22) % shard_count
+
+
+class ShardCoordinator:
+    # Runs the shards of this process, each one with its own command pipeline
+    def __init__(
+        self,
+        shard_ids: list[int],
+        shard_count: int,
+        on_error: Optional[Callable[[Exception], Awaitable[None]]] = None
+    ) -> None:
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.gateway_clients: dict[int, DiscordGatewayClient] = {}
+        self.command_dispatchers = {shard_id: CommandDispatcher(on_error=on_error) for shard_id in shard_ids}
+
+    def add_gateway_client(self, shard_id: int, gateway_client: DiscordGatewayClient) -> None:
+        self.gateway_clients[shard_id] = gateway_client
+
+    def start(self) -> None:
+        for command_dispatcher in self.command_dispatchers.values():
+            command_dispatcher.start()
+
+    async def stop(self) -> None:
+        await asyncio.gather(*[command_dispatcher.stop() for command_dispatcher in self.command_dispatchers.values()])
+
+    async def run(self) -> None:
+        await asyncio.gather(*[gateway_client.run() for gateway_client in self.gateway_clients.values()])
+
+    def dispatch(self, func: Callable[[Message], Awaitable[None]], message: Message) -> bool:
+        shard_id = get_shard_id(message.guild_id, self.shard_count)
+        command_dispatcher = self.command_dispatchers.get(shard_id)
+        if command_dispatcher is None:
+            log(f'Ignored command for shard {shard_id}, not run by this process', LogLevel.WARNING)
+            return False
+        return command_dispatcher.dispatch(func, message)
+
+    def get_stats(self) -> dict:
+        return {shard_id: gateway_client.get_stats() for shard_id, gateway_client in self.gateway_clients.items()}
+
+    async def update_presence(self, presence_activities: list[PresenceActivity]) -> None:
+        # The presence is set per connection
+        await asyncio.gather(*[
+            gateway_client.update_presence(presence_activities) for gateway_client in self.gateway_clients.values()
+        ])
@@ -1,3 +1,5 @@
 from .discord_gateway_client import DiscordGatewayClient
+from .identify_limiter import IdentifyLimiter
 from .discord_api_client import DiscordApiClient
 from .coc_api_client import ClashOfClansApiClient
+from utils import RequestPriority, create_background_task
@@ -1,51 +1,95 @@
-import requests
-from typing import Optional
+import aiohttp
+from typing import Any, Mapping, Optional
 
 from utils.logger import log, LogLevel
+from utils.json_codec import json_loads, json_dumps
+
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 10  # seconds
+DEFAULT_KEEPALIVE_TIMEOUT = 60  # seconds
+
+
+class ApiResponse:
+    def __init__(self, method: str, url: str, status_code: int, headers: Mapping[str, str], body: bytes) -> None:
+        self.method = method
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        return json_loads(self.body)
 
 
 class BaseApiClient:
-    def __init__(self, base_url: str, authorization_header: Optional[dict]) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        authorization_header: Optional[dict],
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT
+    ) -> None:
         self.base_url = base_url
         self.authorization_header = authorization_header
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    def get_session(self) -> aiohttp.ClientSession:
+        # The session has to be created lazily, from inside the running event loop
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.authorization_header,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                json_serialize=json_dumps
+            )
+        return self.session
 
-    def log_error_response(self, response: requests.Response):
+    async def close(self) -> None:
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def log_error_response(self, response: ApiResponse):
         category = response.status_code // 100
-        if category == 4:  # Bad request
-            log(f'Bad request: got {response.status_code} calling {response.request.url}', LogLevel.ERROR)
+        if response.status_code == 429:
+            log(f'Rate limited: got {response.status_code} calling {response.url}', LogLevel.WARNING)
+        elif category == 4:  # Bad request
+            log(f'Bad request: got {response.status_code} calling {response.url}', LogLevel.ERROR)
         elif category == 5:
-            log(f'Server internal error: got {response.status_code} calling {response.request.url}', LogLevel.ERROR)
-
-    async def GET(self, url: str) -> requests.Response:
-        response = requests.get(
-            f'{self.base_url}/{url}',
-            headers=self.authorization_header
-        )
-        self.log_error_response(response)
-        return response
-
-    async def DELETE(self, url: str) -> requests.Response:
-        response = requests.delete(
-            f'{self.base_url}/{url}',
-            headers=self.authorization_header
-        )
-        self.log_error_response(response)
-        return response
-
-    async def PATCH(self, url: str, body: dict) -> requests.Response:
-        response = requests.patch(
-            f'{self.base_url}/{url}',
-            headers=self.authorization_header,
-            json=body
-        )
-        self.log_error_response(response)
-        return response
-
-    async def POST(self, url: str, body: dict) -> requests.Response:
-        response = requests.post(
-            f'{self.base_url}/{url}',
-            headers=self.authorization_header,
-            json=body
-        )
-        self.log_error_response(response)
-        return response
+            log(f'Server internal error: got {response.status_code} calling {response.url}', LogLevel.ERROR)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        body: Optional[dict] = None,
+        headers: Optional[dict] = None
+    ) -> ApiResponse:
+        session = self.get_session()
+        async with session.request(method, f'{self.base_url}/{url}', json=body, headers=headers) as response:
+            raw_body = await response.read()
+            api_response = ApiResponse(method, str(response.url), response.status, response.headers, raw_body)
+        self.log_error_response(api_response)
+        return api_response
+
+    async def GET(self, url: str) -> ApiResponse:
+        return await self.request('GET', url)
+
+    async def DELETE(self, url: str) -> ApiResponse:
+        return await self.request('DELETE', url)
+
+    async def PATCH(self, url: str, body: dict) -> ApiResponse:
+        return await self.request('PATCH', url, body)
+
+    async def POST(self, url: str, body: dict) -> ApiResponse:
+        return await self.request('POST', url, body)
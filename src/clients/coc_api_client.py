@@ -1,18 +1,81 @@
+import asyncio
 import urllib.parse
 from typing import Optional
 
 from models.clash_of_clans import Clan, ClanMember, War, CWLGroup, CapitalRaidSeason, Player
-from .base_api_client import BaseApiClient
-from utils import log, LogLevel
+from .base_api_client import ApiResponse, BaseApiClient, DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT
+from .response_cache import ResponseCache, DEFAULT_CACHE_MAX_BYTES
+from .rate_limiter import RateLimiter, compute_backoff
+from utils import log, LogLevel, single_flight, request_priority
 
 
 COC_API_BASE_URL = 'https://api.clashofclans.com/v1'
+DEFAULT_REQUESTS_PER_SECOND = 10
+MAX_RETRIES = 4
+CWL_ROUND_CONCURRENCY = 4
 
 
 class ClashOfClansApiClient(BaseApiClient):
-    def __init__(self, api_token: str) -> None:
-        super().__init__(COC_API_BASE_URL, {'Authorization': f'Bearer {api_token}'})
+    def __init__(
+        self,
+        api_token: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+        requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND
+    ) -> None:
+        super().__init__(
+            COC_API_BASE_URL,
+            {'Authorization': f'Bearer {api_token}'},
+            pool_size=pool_size,
+            timeout=timeout
+        )
+        self.response_cache = ResponseCache(cache_max_bytes)
+        self.rate_limiter = RateLimiter(requests_per_second)
+        # Round (its war tags) => clan tag => tag of the war of that clan, resolved once per league day
+        self.cwl_round_war_tags: dict[tuple[str, ...], dict[str, str]] = {}
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        body: Optional[dict] = None,
+        headers: Optional[dict] = None
+    ) -> ApiResponse:
+        priority = request_priority.get()
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(priority)
+            response = await super().request(method, url, body, headers)
+            if response.status_code != 429 or attempt >= MAX_RETRIES:
+                return response
+            retry_after = response.headers.get('Retry-After', '')
+            delay = compute_backoff(attempt)
+            if retry_after.replace('.', '', 1).isdigit():
+                delay += float(retry_after)
+            log(f'Throttled by the CoC API, retrying in {delay:.2f}s', LogLevel.WARNING)
+            self.rate_limiter.pause(delay)
+            attempt += 1
+
+    async def GET(self, url: str) -> ApiResponse:
+        cached = self.response_cache.get(url)
+        if cached is not None and cached.is_fresh():
+            self.response_cache.hits += 1
+            return cached.response
+        self.response_cache.misses += 1
+
+        response = await self.request('GET', url, headers=cached.conditional_headers() if cached else None)
+        if response.status_code == 304:
+            cached_response = self.response_cache.refresh(url, response)
+            if cached_response is not None:
+                return cached_response
+            # Evicted while revalidating: the full response is needed
+            response = await self.request('GET', url)
+        if response.status_code == 200:
+            self.response_cache.store(url, response)
+        return response
 
+    @single_flight
     async def get_clan_members(self, clan_tag: str) -> list[ClanMember]:
         response = await self.GET(f'clans/{urllib.parse.quote(clan_tag)}/members')
         if response.status_code == 200:
@@ -25,12 +88,14 @@ class ClashOfClansApiClient(BaseApiClient):
             return War(response.json())
         return None
 
+    @single_flight
     async def get_current_leaguegroup(self, clan_tag: str) -> Optional[CWLGroup]:
         response = await self.GET(f'clans/{urllib.parse.quote(clan_tag)}/currentwar/leaguegroup')
         if response.status_code == 200:
             return CWLGroup(response.json())
         return None
 
+    @single_flight
     async def get_cwl_war(self, war_tag: str) -> Optional[War]:
         response = await self.GET(f'clanwarleagues/wars/{urllib.parse.quote(war_tag)}')
         if response.status_code == 200:
@@ -49,6 +114,7 @@ class ClashOfClansApiClient(BaseApiClient):
             return seasons[0]
         return None
 
+    @single_flight
     async def get_current_war(self, clan_tag: str) -> Optional[War]:
         war = await self.get_current_regular_war(clan_tag)
         if war is not None and war.state != 'notInWar':
@@ -62,33 +128,57 @@ class ClashOfClansApiClient(BaseApiClient):
             log(f'No league group found', LogLevel.INFO)
             return None
 
-        war = None
+        # Forget the rounds of previous leagues
+        round_keys = [tuple(round.war_tags) for round in cwl_group.rounds]
+        self.cwl_round_war_tags = {k: v for k, v in self.cwl_round_war_tags.items() if k in round_keys}
+
         league_day = len(cwl_group.rounds)
-        for war_tag in cwl_group.rounds[-1].war_tags:
-            cwl_war = await self.get_cwl_war(war_tag)
-            if cwl_war is not None and (cwl_war.clan.tag == clan_tag or cwl_war.opponent.tag == clan_tag):
-                war = cwl_war
-                break
+        war = await self.find_cwl_round_war(clan_tag, cwl_group.rounds[-1])
 
         if war is not None and war.state in 'preparation' and len(cwl_group.rounds) > 1:
             league_day -= 1
-            for war_tag in cwl_group.rounds[-2].war_tags:
-                cwl_war = await self.get_cwl_war(war_tag)
-                if cwl_war is not None and (cwl_war.clan.tag == clan_tag or cwl_war.opponent.tag == clan_tag):
-                    war = cwl_war
-                    break
+            previous_war = await self.find_cwl_round_war(clan_tag, cwl_group.rounds[-2])
+            if previous_war is not None:
+                war = previous_war
 
         if war is not None:
             log(f'Found war for league day {league_day}', LogLevel.INFO)
             war.league_day = league_day
         return war
 
+    async def find_cwl_round_war(self, clan_tag: str, cwl_round: CWLGroup.Round) -> Optional[War]:
+        clan_war_tags = self.cwl_round_war_tags.setdefault(tuple(cwl_round.war_tags), {})
+        known_war_tag = clan_war_tags.get(clan_tag)
+        if known_war_tag is not None:
+            return await self.get_cwl_war(known_war_tag)
+
+        semaphore = asyncio.Semaphore(CWL_ROUND_CONCURRENCY)
+
+        async def fetch_cwl_war(war_tag: str) -> tuple[str, Optional[War]]:
+            async with semaphore:
+                return war_tag, await self.get_cwl_war(war_tag)
+
+        tasks = [asyncio.create_task(fetch_cwl_war(war_tag)) for war_tag in cwl_round.war_tags]
+        try:
+            for next_fetched in asyncio.as_completed(tasks):
+                war_tag, cwl_war = await next_fetched
+                if cwl_war is None:
+                    continue
+                clan_war_tags[cwl_war.clan.tag] = clan_war_tags[cwl_war.opponent.tag] = war_tag
+                if clan_tag in (cwl_war.clan.tag, cwl_war.opponent.tag):
+                    return cwl_war
+        finally:
+            for task in tasks:  # No need to wait for the other wars once ours is found
+                task.cancel()
+        return None
+
     async def get_clan(self, clan_tag: str) -> Optional[Clan]:
         response = await self.GET(f'clans/{urllib.parse.quote(clan_tag)}')
         if response.status_code == 200:
             return Clan(response.json())
         return None
 
+    @single_flight
     async def get_player(self, player_tag: str) -> Optional[Player]:
         response = await self.GET(f'players/{urllib.parse.quote(player_tag)}')
         if response.status_code == 200:
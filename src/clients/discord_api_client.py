@@ -3,20 +3,73 @@ from typing import Optional
 from dotenv import load_dotenv
 
 from models.discord import Message, embed
-from .base_api_client import BaseApiClient
+from utils import log, LogLevel
+from .base_api_client import ApiResponse, BaseApiClient, DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT
+from .discord_rate_limiter import DiscordRateLimiter
 
 
 DISCORD_API_BASE_URL = 'https://discord.com/api/v10'
+MAX_RETRIES = 3
+DEFAULT_RETRY_AFTER = 1  # seconds, when Discord doesn't say how long to wait
 load_dotenv()
 ENV = os.environ.get('ENV', 'DEV')
 
 
 class DiscordApiClient(BaseApiClient):
-    def __init__(self, authorization_token: str) -> None:
+    def __init__(
+        self,
+        authorization_token: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT
+    ) -> None:
         super().__init__(
             DISCORD_API_BASE_URL,
-            {'Authorization': authorization_token}
+            {'Authorization': authorization_token},
+            pool_size=pool_size,
+            timeout=timeout
         )
+        self.rate_limiter = DiscordRateLimiter()
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        body: Optional[dict] = None,
+        headers: Optional[dict] = None
+    ) -> ApiResponse:
+        bucket = self.rate_limiter.get_bucket(method, url)
+        attempt = 0
+        while True:
+            await bucket.reserve()
+            await self.rate_limiter.global_limiter.acquire()
+            response = await super().request(method, url, body, headers)
+            self.rate_limiter.update(method, url, bucket, response.headers)
+            if response.status_code != 429 or attempt >= MAX_RETRIES:
+                return response
+            retry_after = self.get_retry_after(response)
+            if response.headers.get('X-RateLimit-Global') == 'true':
+                self.rate_limiter.global_limiter.pause(retry_after)
+            else:
+                bucket.pause(retry_after)
+            log(f'Throttled by Discord on {method} {url}, retrying in {retry_after}s', LogLevel.WARNING)
+            attempt += 1
+
+    @staticmethod
+    def get_retry_after(response: ApiResponse) -> float:
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.replace('.', '', 1).isdigit():
+            return float(retry_after)
+        try:  # Also given in the body of 429 responses
+            return float(response.json()['retry_after'])
+        except (ValueError, KeyError, TypeError):
+            return DEFAULT_RETRY_AFTER
+
+    async def get_gateway_bot(self) -> Optional[dict]:
+        # Recommended shard count and identify limits of the bot
+        response = await self.GET('gateway/bot')
+        if response.status_code == 200:
+            return response.json()
+        return None
 
     async def send_message(
         self,
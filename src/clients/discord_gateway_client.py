@@ -1,14 +1,30 @@
 import os
 from websockets.asyncio.client import connect, ClientConnection
-from websockets.exceptions import ConnectionClosedError
+from websockets.exceptions import ConnectionClosed, ConnectionClosedError
 import asyncio
-import json
+import random
+import zlib
+from time import time, monotonic
 from typing import Optional
 from models.discord import WsMessage, WsMessageType, EventType, PresenceActivity
-from utils import log, LogLevel
+from utils import log, LogLevel, json_loads, json_dumps, RollingHistogram
+from .gateway_send_queue import GatewaySendQueue
+from .identify_limiter import IdentifyLimiter
 
 
-DISCORD_GATEWAY_URL = 'wss://gateway.discord.gg?v=10'
+DISCORD_GATEWAY_QUERY = '?v=10'
+DISCORD_GATEWAY_URL = f'wss://gateway.discord.gg{DISCORD_GATEWAY_QUERY}'
+ZLIB_SUFFIX = b'\x00\x00\xff\xff'
+
+SESSION_MAX_AGE = 600  # seconds, older persisted sessions are not worth a resume attempt
+SESSION_SAVE_INTERVAL = 30  # seconds, the session is also saved before each handled message
+# The session is gone: identify again
+SESSION_INVALIDATING_CLOSE_CODES = (4007, 4009)
+# Reconnecting would fail again: authentication failed, invalid shard, sharding required, invalid API version
+# or invalid/disallowed intents
+FATAL_CLOSE_CODES = (4004, 4010, 4011, 4012, 4013, 4014)
+# Closing with 1000 or 1001 would end the session
+RESUMABLE_CLOSE_CODE = 4000
 
 
 class DiscordGatewayClient:
@@ -17,83 +33,361 @@ class DiscordGatewayClient:
         app_name: str,
         authorization_token: str,
         on_ready = None,
+        on_resumed = None,
         on_message = None,
         on_message_update = None,
-        on_error = None
+        on_error = None,
+        compress = False,
+        message_prefix: Optional[str] = None,
+        session_file: Optional[str] = None,
+        shard: Optional[tuple[int, int]] = None,
+        identify_limiter: Optional[IdentifyLimiter] = None
     ) -> None:
         self.app_name = app_name
         self.authorization_token = authorization_token
         self.websocket: Optional[ClientConnection] = None
         self.on_ready = on_ready
+        self.on_resumed = on_resumed
         self.on_message = on_message
         self.on_error = on_error
         self.on_message_update = on_message_update
+        self.shard = shard  # (shard ID, shard count)
+        self.identify_limiter = identify_limiter
         self.session_id: Optional[str] = None
         self.sequence_number: Optional[int] = None
-        self.scheduled_heartbeat_task: Optional[asyncio.TimerHandle] = None
+        self.resume_gateway_url: Optional[str] = None
+        self.user: Optional[dict] = None  # From READY, saved with the session for a resumed process to know it
+        self.send_queue = GatewaySendQueue()
+
+        # Heartbeats: a connection whose last heartbeat was not acknowledged is a zombie
+        self.heartbeat_task: Optional[asyncio.Task] = None
+        self.heartbeat_acked = True
+        self.heartbeat_sent_at: Optional[float] = None
+        self.heartbeat_latencies = RollingHistogram()  # ms
+        # Identifying can wait for the identify limiter: done aside so that heartbeat ACKs are still received
+        self.identify_task: Optional[asyncio.Task] = None
+        self.connections = 0
+        self.identifies = 0
+        self.resumes = 0
+        self.resumed_sessions = 0
+        self.invalid_sessions = 0
+        self.zombie_connections = 0
+
+        # MESSAGE_CREATE events whose content can't start with this prefix are dropped before being decoded
+        self.message_prefix = message_prefix
+        self.frames_received = 0
+        self.skipped_events = 0  # Events without handler
+        self.skipped_messages = 0  # Messages without prefix
+
+        # zlib-stream transport compression: one zlib context for the whole connection
+        self.compress = compress
+        self.inflator = zlib.decompressobj()
+        self.compressed_buffer = bytearray()
+        self.bytes_received = 0  # On the wire
+        self.bytes_decompressed = 0
+
+        # Session persisted to disk so that a restart resumes instead of identifying again
+        self.session_file = session_file
+        self.session_saved_at = 0.0
+        self.load_session()
+
+    @property
+    def can_resume(self) -> bool:
+        return self.session_id is not None and self.sequence_number is not None
+
+    @property
+    def shard_label(self) -> str:
+        return '' if self.shard is None else f' (shard {self.shard[0]}/{self.shard[1]})'
+
+    @property
+    def gateway_url(self) -> str:
+        url = DISCORD_GATEWAY_URL
+        if self.can_resume and self.resume_gateway_url is not None:
+            url = f'{self.resume_gateway_url.rstrip('/')}{DISCORD_GATEWAY_QUERY}'
+        if self.compress:
+            return f'{url}&compress=zlib-stream'
+        return url
+
+    def load_session(self) -> None:
+        if self.session_file is None or not os.path.exists(self.session_file):
+            return
+        try:
+            with open(self.session_file) as file:
+                session = json_loads(file.read())
+        except (OSError, ValueError) as e:
+            log(f'Unable to load gateway session: {e}', LogLevel.WARNING)
+            return
+        if time() - session.get('saved_at', 0) > SESSION_MAX_AGE or session.get('user') is None:
+            return
+        self.session_id = session.get('session_id')
+        self.sequence_number = session.get('sequence_number')
+        self.resume_gateway_url = session.get('resume_gateway_url')
+        self.user = session['user']
+
+    def save_session(self) -> None:
+        if self.session_file is None:
+            return
+        self.session_saved_at = time()
+        try:
+            with open(self.session_file, 'w') as file:
+                file.write(json_dumps({
+                    'session_id': self.session_id,
+                    'sequence_number': self.sequence_number,
+                    'resume_gateway_url': self.resume_gateway_url,
+                    'user': self.user,
+                    'saved_at': self.session_saved_at
+                }))
+        except OSError as e:
+            log(f'Unable to save gateway session: {e}', LogLevel.WARNING)
+
+    def clear_session(self) -> None:
+        self.session_id = None
+        self.sequence_number = None
+        self.resume_gateway_url = None
+        self.user = None
+        self.save_session()
+
+    def get_dispatch_stats(self) -> dict:
+        return {
+            'frames_received': self.frames_received,
+            'skipped_events': self.skipped_events,
+            'skipped_messages': self.skipped_messages
+        }
+
+    def has_handler(self, event_name: Optional[str]) -> bool:
+        if event_name == EventType.READY.value:
+            return True  # The session ID is needed to resume
+        if event_name == EventType.RESUMED.value:
+            return True
+        if event_name == EventType.MESSAGE_CREATE.value:
+            return self.on_message is not None
+        if event_name == EventType.MESSAGE_UPDATE.value:
+            return self.on_message_update is not None
+        return False
+
+    def can_skip(self, str_message: str | bytes) -> bool:
+        header = WsMessage.peek(str_message)
+        if header is None or header[0] != WsMessageType.DISPATCH.value:
+            return False
+        _, event_name, sequence_number = header
+        if not self.has_handler(event_name):
+            self.skipped_events += 1
+        elif event_name != EventType.MESSAGE_CREATE.value or self.message_prefix is None:
+            return False
+        elif not WsMessage.may_have_content_starting_with(str_message, self.message_prefix):
+            self.skipped_messages += 1
+        else:
+            return False
+        self.sequence_number = sequence_number
+        return True
+
+    def get_health_stats(self) -> dict:
+        return {
+            'connected': self.websocket is not None,
+            'reconnects': max(0, self.connections - 1),
+            'identifies': self.identifies,
+            'resumes': self.resumes,
+            'resumed_sessions': self.resumed_sessions,
+            'invalid_sessions': self.invalid_sessions,
+            'zombie_connections': self.zombie_connections,
+            'heartbeat_latency': self.heartbeat_latencies.get_stats()
+        }
+
+    def get_stats(self) -> dict:
+        return {
+            'shard': None if self.shard is None else list(self.shard),
+            'health': self.get_health_stats(),
+            'dispatch': self.get_dispatch_stats(),
+            'send': self.get_send_stats(),
+            'compression': self.get_compression_stats()
+        }
+
+    def get_send_stats(self) -> dict:
+        return {
+            'sent': self.send_queue.sent_count,
+            'queued': len(self.send_queue.messages),
+            'coalesced_presences': self.send_queue.coalesced_presences
+        }
+
+    def get_compression_stats(self) -> dict:
+        return {
+            'compress': self.compress,
+            'bytes_received': self.bytes_received,
+            'bytes_decompressed': self.bytes_decompressed,
+            'ratio': self.bytes_received / self.bytes_decompressed if self.bytes_decompressed > 0 else None
+        }
+
+    def decompress(self, frame: str | bytes) -> Optional[str | bytes]:
+        # Returns the full payload, or None while waiting for the frames that complete it
+        self.bytes_received += len(frame)
+        if isinstance(frame, str):
+            self.bytes_decompressed += len(frame)
+            return frame
+        self.compressed_buffer.extend(frame)
+        if len(frame) < 4 or frame[-4:] != ZLIB_SUFFIX:
+            return None
+        payload = self.inflator.decompress(self.compressed_buffer)
+        self.compressed_buffer.clear()
+        self.bytes_decompressed += len(payload)
+        return payload
 
     async def send_websocket_message(self, message: WsMessage) -> None:
-        if self.websocket is None:
+        # Queued, the presence is kept while disconnected to be sent once connected again
+        if self.websocket is None and message.operation != WsMessageType.PRESENCE_UPDATE.value:
             return
-        await self.websocket.send(json.dumps(message.to_dict()))
+        self.send_queue.put(message)
+
+    async def send_queued_messages(self, websocket: ClientConnection) -> None:
+        try:
+            while True:
+                message = await self.send_queue.get()
+                await websocket.send(message.to_json())
+                if message.operation == WsMessageType.HEARTBEAT.value:
+                    self.heartbeat_sent_at = monotonic()
+        except ConnectionClosed:
+            pass  # Handled by the receiving loop
+
+    async def send_heartbeats(self, websocket: ClientConnection) -> None:
+        # The first heartbeat is jittered so that shards don't send theirs together
+        await asyncio.sleep(self.heartbeat_interval / 1000 * random.random())
+        while True:
+            if not self.heartbeat_acked:
+                self.zombie_connections += 1
+                log(f'Heartbeat not acknowledged, reconnecting{self.shard_label}', LogLevel.WARNING)
+                await websocket.close(RESUMABLE_CLOSE_CODE)
+                return
+            self.heartbeat_acked = False
+            await self.send_websocket_message(WsMessage(WsMessageType.HEARTBEAT.value, self.sequence_number))
+            await asyncio.sleep(self.heartbeat_interval / 1000)
 
     async def run(self) -> None:
         self.reconnect = True
-        while self.reconnect:
-            try:
-                async with connect(DISCORD_GATEWAY_URL) as websocket:
-                    log('Connected to Discord gateway', LogLevel.INFO)
-                    self.websocket = websocket
-                    async for message in websocket:
-                        await self.handle_received_message(message)
-            except ConnectionClosedError as e:
-                log(f'Connection closed: {e.code} - {e.reason}', LogLevel.WARNING)
-                await self.handle_closed_connection()
-            except Exception as e:
-                await self.handle_closed_connection()
-                if self.on_error is None:
-                    raise e
-                await self.on_error(e)
+        try:
+            while self.reconnect:
+                try:
+                    async with connect(self.gateway_url, max_size=None) as websocket:
+                        log(f'Connected to Discord gateway{self.shard_label}', LogLevel.INFO)
+                        self.connections += 1
+                        self.websocket = websocket
+                        self.inflator = zlib.decompressobj()
+                        self.compressed_buffer.clear()
+                        self.send_queue.clear()
+                        sender = asyncio.create_task(self.send_queued_messages(websocket))
+                        try:
+                            async for frame in websocket:
+                                message = self.decompress(frame)
+                                if message is not None:
+                                    await self.handle_received_message(message)
+                        except asyncio.CancelledError:
+                            # Leaving the context would close with 1000, ending the session saved for the next process
+                            await websocket.close(RESUMABLE_CLOSE_CODE)
+                            raise
+                        finally:
+                            sender.cancel()
+                except ConnectionClosedError as e:
+                    log(f'Connection closed: {e.code} - {e.reason}', LogLevel.WARNING)
+                    if e.code in SESSION_INVALIDATING_CLOSE_CODES:
+                        self.clear_session()
+                    elif e.code in FATAL_CLOSE_CODES:
+                        self.reconnect = False
+                except Exception as e:
+                    if self.on_error is None:
+                        raise e
+                    await self.on_error(e)
+                finally:
+                    await self.handle_closed_connection()
+        finally:
+            # Lets the next process resume the session
+            if self.can_resume:
+                self.save_session()
 
     async def handle_closed_connection(self) -> None:
         if self.websocket is not None:
             self.websocket = None
-        if self.scheduled_heartbeat_task is not None:
-            self.scheduled_heartbeat_task.cancel()
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+        if self.identify_task is not None:
+            self.identify_task.cancel()
+            self.identify_task = None
+        if self.compress:
+            stats = self.get_compression_stats()
+            log(f'Gateway bytes received: {stats['bytes_received']} ({stats['bytes_decompressed']} decompressed)')
 
     async def handle_received_message(self, str_message) -> None:
         if self.websocket is None:
             return
+        self.frames_received += 1
+        if self.can_skip(str_message):
+            return
         message = WsMessage.parse(str_message)
-        self.sequence_number = message.sequence_number
+        if message.sequence_number is not None:
+            self.sequence_number = message.sequence_number
         if message.operation == WsMessageType.HELLO.value:
             self.heartbeat_interval = message.data['heartbeat_interval']
-            await self.send_websocket_message(WsMessage(WsMessageType.HEARTBEAT.value))
-            if self.session_id is None or self.sequence_number is None:
-                await self.identify()
-            else:
+            self.heartbeat_acked = True
+            self.heartbeat_sent_at = None
+            self.heartbeat_task = asyncio.create_task(self.send_heartbeats(self.websocket))
+            if self.can_resume:
                 await self.resume()
+            else:
+                self.start_identify()
+        elif message.operation == WsMessageType.HEARTBEAT.value:
+            await self.send_websocket_message(WsMessage(WsMessageType.HEARTBEAT.value, self.sequence_number))
         elif message.operation == WsMessageType.RECONNECT.value:
-            await self.websocket.close()
+            await self.websocket.close(RESUMABLE_CLOSE_CODE)
+        elif message.operation == WsMessageType.INVALID_SESSION.value:
+            # The payload tells whether the session can still be resumed on a new connection
+            self.invalid_sessions += 1
+            if message.data is True:
+                log('Gateway session invalidated, resuming', LogLevel.WARNING)
+                await self.websocket.close(RESUMABLE_CLOSE_CODE)
+            else:
+                log('Gateway session invalidated, identifying', LogLevel.WARNING)
+                self.clear_session()
+                self.send_queue.is_session_ready = False  # Until the READY of the new session
+                self.start_identify(random.uniform(1, 5))
         elif message.operation == WsMessageType.HEARTBEAT_ACK.value:
-            event_loop = asyncio.get_event_loop()
-            self.scheduled_heartbeat_task = event_loop.call_later(
-                self.heartbeat_interval / 1000,
-                self.create_heartbeat_task
-            )
+            self.heartbeat_acked = True
+            if self.heartbeat_sent_at is not None:
+                self.heartbeat_latencies.add((monotonic() - self.heartbeat_sent_at) * 1000)
+                self.heartbeat_sent_at = None
         elif message.operation == WsMessageType.DISPATCH.value:
-            if message.event_name == EventType.READY.value and self.on_ready is not None:
+            if time() - self.session_saved_at > SESSION_SAVE_INTERVAL:
+                self.save_session()
+            if message.event_name == EventType.READY.value:
                 self.session_id = message.data['session_id']
-                await self.on_ready(message.data)
+                self.resume_gateway_url = message.data.get('resume_gateway_url')
+                self.user = message.data['user']
+                self.save_session()
+                self.send_queue.set_session_ready()
+                if self.on_ready is not None:
+                    await self.on_ready(message.data)
+            elif message.event_name == EventType.RESUMED.value:
+                self.resumed_sessions += 1
+                log('Gateway session resumed', LogLevel.INFO)
+                self.send_queue.set_session_ready()
+                if self.on_resumed is not None and self.user is not None:
+                    # Same fields as READY, that a resumed session never receives
+                    resumed_data: dict = {'user': self.user}
+                    if self.shard is not None:
+                        resumed_data['shard'] = list(self.shard)
+                    await self.on_resumed(resumed_data)
             elif message.event_name == EventType.MESSAGE_CREATE.value and self.on_message is not None:
+                # Saved first: a killed process must not resume before this message and handle it again
+                self.save_session()
                 await self.on_message(message.data)
             elif message.event_name == EventType.MESSAGE_UPDATE.value and self.on_message_update is not None:
+                self.save_session()
                 await self.on_message_update(message.data)
 
-    def create_heartbeat_task(self) -> None:
-        asyncio.create_task(self.send_websocket_message(WsMessage(WsMessageType.HEARTBEAT.value)))
+    def start_identify(self, delay: float = 0) -> None:
+        if self.identify_task is not None:
+            self.identify_task.cancel()
+        self.identify_task = asyncio.create_task(self.identify(delay))
 
-    async def identify(self) -> None:
+    async def identify(self, delay: float = 0) -> None:
+        await asyncio.sleep(delay)
         data: dict = {
             'token': self.authorization_token,
             'properties': {
@@ -104,12 +398,18 @@ class DiscordGatewayClient:
         }
         if self.authorization_token.startswith('Bot '):
             data['intents'] = 46592
+        if self.shard is not None:
+            data['shard'] = list(self.shard)
+        if self.identify_limiter is not None:
+            await self.identify_limiter.acquire(0 if self.shard is None else self.shard[0])
+        self.identifies += 1
         await self.send_websocket_message(WsMessage(
             WsMessageType.IDENTIFY.value,
             data
         ))
 
     async def resume(self) -> None:
+        self.resumes += 1
         await self.send_websocket_message(WsMessage(
             WsMessageType.RESUME.value,
             {
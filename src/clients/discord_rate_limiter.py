@@ -0,0 +1,80 @@
+import asyncio
+import re
+from time import monotonic
+from typing import Mapping, Optional
+
+from .rate_limiter import RateLimiter
+
+
+DISCORD_GLOBAL_REQUESTS_PER_SECOND = 50
+MAJOR_PARAMETER_REGEX = re.compile(r'^(channels|guilds|webhooks)/(\d+)')
+SNOWFLAKE_REGEX = re.compile(r'\d{15,}')
+
+
+class RouteBucket:
+    def __init__(self) -> None:
+        # Requests of a bucket are started in order, which keeps messages ordered within a channel. The lock is only
+        # held until a request is allowed, not during the request
+        self.lock = asyncio.Lock()
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.
+
+    async def reserve(self) -> None:
+        async with self.lock:
+            await self.wait()
+            if self.remaining is not None:
+                self.remaining -= 1
+
+    async def wait(self) -> None:
+        if self.remaining == 0:
+            delay = self.reset_at - monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.remaining = None
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_after = headers.get('X-RateLimit-Reset-After')
+        if remaining is not None and remaining.isdigit():
+            self.remaining = int(remaining)
+        if reset_after is not None:
+            self.reset_at = monotonic() + float(reset_after)
+
+    def pause(self, delay: float) -> None:
+        self.remaining = 0
+        self.reset_at = max(self.reset_at, monotonic() + delay)
+
+
+class DiscordRateLimiter:
+    def __init__(self, global_requests_per_second: float = DISCORD_GLOBAL_REQUESTS_PER_SECOND) -> None:
+        self.global_limiter = RateLimiter(global_requests_per_second)
+        self.route_bucket_keys: dict[str, str] = {}  # Route key => bucket key, learned from X-RateLimit-Bucket
+        self.buckets: dict[str, RouteBucket] = {}
+
+    @staticmethod
+    def get_route_key(method: str, url: str) -> str:
+        # 'POST channels/123/messages' => 'POST channels/{id}/messages:123' (buckets are per major parameter)
+        path = url.split('?')[0]
+        match = MAJOR_PARAMETER_REGEX.match(path)
+        major_parameter = match.group(2) if match else ''
+        return f'{method} {SNOWFLAKE_REGEX.sub('{id}', path)}:{major_parameter}'
+
+    def get_bucket(self, method: str, url: str) -> RouteBucket:
+        route_key = self.get_route_key(method, url)
+        bucket_key = self.route_bucket_keys.get(route_key, route_key)
+        if bucket_key not in self.buckets:
+            self.buckets[bucket_key] = RouteBucket()
+        return self.buckets[bucket_key]
+
+    def update(self, method: str, url: str, bucket: RouteBucket, headers: Mapping[str, str]) -> None:
+        bucket.update(headers)
+        bucket_hash = headers.get('X-RateLimit-Bucket')
+        if bucket_hash is None:
+            return
+        route_key = self.get_route_key(method, url)
+        bucket_key = f'{bucket_hash}:{route_key.rsplit(':', 1)[1]}'
+        if self.route_bucket_keys.get(route_key) != bucket_key:
+            self.route_bucket_keys[route_key] = bucket_key
+            self.buckets.setdefault(bucket_key, bucket)
+            if self.buckets.get(route_key) is bucket:
+                del self.buckets[route_key]
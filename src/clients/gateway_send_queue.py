@@ -0,0 +1,107 @@
+import asyncio
+from collections import deque
+from time import time
+from typing import Optional
+
+from models.discord import WsMessage, WsMessageType
+
+
+GATEWAY_SEND_LIMIT = 120  # events per period and per connection
+GATEWAY_SEND_PERIOD = 60  # seconds
+HEARTBEAT_RESERVED_SENDS = 5  # Only usable by heartbeats, so that they are never delayed by the other events
+# The only events accepted by Discord before READY or RESUMED, besides heartbeats
+HANDSHAKE_OPERATIONS = (WsMessageType.IDENTIFY.value, WsMessageType.RESUME.value)
+
+
+class GatewaySendQueue:
+    # Heartbeats are sent first, then the other events in order, then the latest presence update.
+    # Until the session is ready, only heartbeats and the handshake are sent: the other events are held
+    def __init__(
+        self,
+        limit: int = GATEWAY_SEND_LIMIT,
+        period: float = GATEWAY_SEND_PERIOD,
+        heartbeat_reserved_sends: int = HEARTBEAT_RESERVED_SENDS
+    ) -> None:
+        self.limit = limit
+        self.period = period
+        self.heartbeat_reserved_sends = heartbeat_reserved_sends
+        self.heartbeat: Optional[WsMessage] = None
+        self.messages: deque[WsMessage] = deque()
+        self.presence: Optional[WsMessage] = None  # Only the latest one is kept
+        self.sent_at: deque[float] = deque()
+        self.has_messages = asyncio.Event()
+        self.is_session_ready = False
+        self.sent_count = 0
+        self.coalesced_presences = 0
+
+    def put(self, message: WsMessage) -> None:
+        if message.operation == WsMessageType.HEARTBEAT.value:
+            self.heartbeat = message
+        elif message.operation == WsMessageType.PRESENCE_UPDATE.value:
+            if self.presence is not None:
+                self.coalesced_presences += 1
+            self.presence = message
+        else:
+            self.messages.append(message)
+        self.has_messages.set()
+
+    def clear(self) -> None:
+        # On a new connection: the budget is reset and only the presence is still worth sending
+        self.heartbeat = None
+        self.messages.clear()
+        self.sent_at.clear()
+        self.is_session_ready = False
+
+    def set_session_ready(self) -> None:
+        # After READY or RESUMED: the held events can be sent
+        self.is_session_ready = True
+        self.has_messages.set()
+
+    def has_sendable_message(self) -> bool:
+        if self.is_session_ready:
+            return len(self.messages) > 0 or self.presence is not None
+        return any(m.operation in HANDSHAKE_OPERATIONS for m in self.messages)
+
+    def get_delay(self, reserved_sends: int) -> float:
+        now = time()
+        while len(self.sent_at) > 0 and self.sent_at[0] <= now - self.period:
+            self.sent_at.popleft()
+        available_sends = self.limit - reserved_sends
+        if len(self.sent_at) < available_sends:
+            return 0
+        return self.sent_at[len(self.sent_at) - available_sends] + self.period - now
+
+    def pop(self) -> WsMessage:
+        if self.heartbeat is not None:
+            message, self.heartbeat = self.heartbeat, None
+            return message
+        if not self.is_session_ready:
+            message = next(m for m in self.messages if m.operation in HANDSHAKE_OPERATIONS)
+            self.messages.remove(message)
+            return message
+        if len(self.messages) > 0:
+            return self.messages.popleft()
+        assert self.presence is not None
+        message, self.presence = self.presence, None
+        return message
+
+    async def get(self) -> WsMessage:
+        while True:
+            self.has_messages.clear()
+            if self.heartbeat is not None:
+                delay = self.get_delay(0)
+            elif self.has_sendable_message():
+                delay = self.get_delay(self.heartbeat_reserved_sends)
+            else:
+                await self.has_messages.wait()
+                continue
+            if delay > 0:
+                # Woken up early if a heartbeat comes in meanwhile
+                try:
+                    await asyncio.wait_for(self.has_messages.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.sent_at.append(time())
+            self.sent_count += 1
+            return self.pop()
@@ -0,0 +1,52 @@
+import asyncio
+import fcntl
+from time import time, sleep
+from typing import Optional
+
+
+IDENTIFY_INTERVAL = 5  # seconds between two identifies of the same bucket
+
+
+class IdentifyLimiter:
+    # Shards whose ID have the same remainder by max_concurrency share a bucket, that allows one identify every 5s.
+    # With a lock file prefix, the buckets are also shared with the other processes running shards of the bot
+    def __init__(self, max_concurrency: int = 1, lock_file_prefix: Optional[str] = None) -> None:
+        self.max_concurrency = max_concurrency
+        self.lock_file_prefix = lock_file_prefix
+        self.locks: dict[int, asyncio.Lock] = {}
+        self.last_identify_at: dict[int, float] = {}
+
+    def get_bucket(self, shard_id: int) -> int:
+        return shard_id % self.max_concurrency
+
+    async def acquire(self, shard_id: int) -> None:
+        bucket = self.get_bucket(shard_id)
+        lock = self.locks.setdefault(bucket, asyncio.Lock())
+        async with lock:
+            if self.lock_file_prefix is not None:
+                await asyncio.to_thread(self.acquire_shared_bucket, bucket)
+                return
+            delay = self.last_identify_at.get(bucket, 0) + IDENTIFY_INTERVAL - time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.last_identify_at[bucket] = time()
+
+    def acquire_shared_bucket(self, bucket: int) -> None:
+        # Blocking, run in a thread: the bucket file is locked while waiting and stores the last identify time
+        with open(f'{self.lock_file_prefix}{bucket}.lock', 'a+') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.seek(0)
+                try:
+                    last_identify_at = float(file.read() or 0)
+                except ValueError:
+                    last_identify_at = 0
+                delay = last_identify_at + IDENTIFY_INTERVAL - time()
+                if delay > 0:
+                    sleep(delay)
+                file.seek(0)
+                file.truncate()
+                file.write(str(time()))
+                file.flush()
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
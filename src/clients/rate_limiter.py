@@ -0,0 +1,68 @@
+import asyncio
+import random
+from collections import deque
+from time import monotonic
+from typing import Optional
+
+from utils import RequestPriority
+
+
+def compute_backoff(attempt: int, base: float = 0.5, cap: float = 30) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RateLimiter:
+    def __init__(self, requests_per_second: float, burst: Optional[int] = None) -> None:
+        self.requests_per_second = requests_per_second
+        self.capacity = burst if burst is not None else max(1, int(requests_per_second))
+        self.tokens = float(self.capacity)
+        self.updated_at = monotonic()
+        self.paused_until = 0.
+        self.waiters: dict[RequestPriority, deque[asyncio.Future]] = {p: deque() for p in RequestPriority}
+        self.wake_up_handle: Optional[asyncio.TimerHandle] = None
+
+    async def acquire(self, priority: RequestPriority = RequestPriority.INTERACTIVE) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self.waiters[priority].append(future)
+        self.wake_up()
+        await future
+
+    def pause(self, delay: float) -> None:
+        # Used when the API tells us to slow down, no token is handed out before the delay expires
+        self.paused_until = max(self.paused_until, monotonic() + delay)
+        self.tokens = 0
+        self.updated_at = self.paused_until
+
+    def refill(self) -> None:
+        now = monotonic()
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.requests_per_second)
+            self.updated_at = now
+
+    def next_waiter(self) -> Optional[asyncio.Future]:
+        for priority in RequestPriority:  # Ordered from highest to lowest priority
+            waiters = self.waiters[priority]
+            while len(waiters) > 0 and waiters[0].done():  # Cancelled while waiting
+                waiters.popleft()
+            if len(waiters) > 0:
+                return waiters.popleft()
+        return None
+
+    def on_wake_up_timer(self) -> None:
+        self.wake_up_handle = None
+        self.wake_up()
+
+    def wake_up(self) -> None:
+        self.refill()
+        now = monotonic()
+        while now >= self.paused_until and self.tokens >= 1:
+            waiter = self.next_waiter()
+            if waiter is None:
+                return
+            self.tokens -= 1
+            waiter.set_result(None)
+
+        if any(len(waiters) > 0 for waiters in self.waiters.values()) and self.wake_up_handle is None:
+            delay = max(self.paused_until - now, (1 - self.tokens) / self.requests_per_second)
+            self.wake_up_handle = asyncio.get_running_loop().call_later(delay, self.on_wake_up_timer)
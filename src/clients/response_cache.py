@@ -0,0 +1,108 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Optional
+
+from .base_api_client import ApiResponse
+
+
+DEFAULT_CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+
+def parse_max_age(response: ApiResponse) -> Optional[int]:
+    # Cache-Control: public max-age=600
+    cache_control = response.headers.get('Cache-Control')
+    if cache_control is None:
+        return None
+    max_age = None
+    for directive in cache_control.replace(',', ' ').split():
+        name, _, value = directive.partition('=')
+        name = name.strip().lower()
+        if name in ('no-store', 'no-cache'):
+            return 0
+        if name == 'max-age' and value.strip().isdigit():
+            max_age = int(value.strip())
+    if max_age is None:
+        return None
+    age = response.headers.get('Age', '0')
+    return max(0, max_age - int(age)) if age.isdigit() else max_age
+
+
+class CachedResponse:
+    def __init__(self, response: ApiResponse, max_age: int) -> None:
+        self.response = response
+        self.etag: Optional[str] = response.headers.get('ETag')
+        self.last_modified: Optional[str] = response.headers.get('Last-Modified')
+        self.size = len(response.url) + len(response.body)
+        self.expires_at = monotonic() + max_age
+
+    def is_fresh(self) -> bool:
+        return monotonic() < self.expires_at
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: OrderedDict[str, CachedResponse] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        entry = self.entries.get(url)
+        if entry is not None:
+            self.entries.move_to_end(url)
+        return entry
+
+    def store(self, url: str, response: ApiResponse) -> None:
+        max_age = parse_max_age(response)
+        if max_age is None:
+            max_age = 0
+        entry = CachedResponse(response, max_age)
+        if max_age == 0 and entry.etag is None and entry.last_modified is None:
+            self.remove(url)  # Nothing to serve nor revalidate later
+            return
+        if entry.size > self.max_bytes:
+            self.remove(url)
+            return
+        self.remove(url)
+        self.entries[url] = entry
+        self.size += entry.size
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions += 1
+
+    def refresh(self, url: str, not_modified_response: ApiResponse) -> Optional[ApiResponse]:
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+        entry.expires_at = monotonic() + (parse_max_age(not_modified_response) or 0)
+        self.revalidations += 1
+        return entry.response
+
+    def remove(self, url: str) -> None:
+        entry = self.entries.pop(url, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'size': self.size,
+            'max_bytes': self.max_bytes
+        }
@@ -1,5 +1,6 @@
 import os
 import asyncio
+from multiprocessing import Process
 from dotenv import load_dotenv
 from bot import Bot
 from utils import log
@@ -9,8 +10,12 @@ load_dotenv()
 CLAN_TAG = '#2GLCQ00G0'
 SECONDARY_CLAN_TAG = '#2JG02GVYL'
 
+SHARD_COUNT = int(os.environ.get('SHARD_COUNT', '1'))
+SHARD_PROCESSES = int(os.environ.get('SHARD_PROCESSES', '1'))
+SHARD_IDS = os.environ.get('SHARD_IDS')  # Comma separated, to split the shards between several machines
 
-async def main():
+
+async def main(shard_ids = None):
     log('bouliste2clan - \033[4mhttps://www.github.com/ZiarZer/bouliste2clan\033[0m')
 
     DISCORD_AUTHORIZATION_TOKEN = os.environ.get('DISCORD_AUTHORIZATION_TOKEN')
@@ -19,9 +24,31 @@ async def main():
 
     COC_API_TOKEN = os.environ.get('COC_API_TOKEN')
 
-    bot = Bot(CLAN_TAG, discord_auth_token, COC_API_TOKEN, secondary_clan_tag=SECONDARY_CLAN_TAG)
+    bot = Bot(
+        CLAN_TAG,
+        discord_auth_token,
+        COC_API_TOKEN,
+        secondary_clan_tag=SECONDARY_CLAN_TAG,
+        shard_ids=shard_ids,
+        shard_count=SHARD_COUNT
+    )
     await bot.run()
 
 
+def run_shards(shard_ids: list[int]):
+    asyncio.run(main(shard_ids))
+
+
 if __name__ == '__main__':
-    asyncio.run(main())
+    shard_ids = list(range(SHARD_COUNT)) if SHARD_IDS is None else [int(i) for i in SHARD_IDS.split(',')]
+    if SHARD_PROCESSES <= 1:
+        run_shards(shard_ids)
+    else:
+        processes = [
+            Process(target=run_shards, args=(shard_ids[i::SHARD_PROCESSES],))
+            for i in range(min(SHARD_PROCESSES, len(shard_ids)))
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
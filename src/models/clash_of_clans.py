@@ -40,6 +40,11 @@ class ClanRole(Enum):
 
 
 class ClanMember:
+    __slots__ = (
+        'tag', 'name', 'role', 'townhall_level', 'exp_level', 'donations', 'donations_received', 'trophies',
+        'builder_base_trophies'
+    )
+
     def __init__(self, raw_member: dict) -> None:
         self.tag: str = raw_member['tag']
         self.name: str = raw_member['name']
@@ -93,6 +98,8 @@ class CapitalRaidSeason:
 
 
 class ClanWarAttack:
+    __slots__ = ('order', 'attacker_tag', 'defender_tag', 'stars', 'destruction_percentage', 'duration')
+
     def __init__(self, raw_attack) -> None:
         self.order: int = raw_attack.get('order')
         self.attacker_tag: str = raw_attack.get('attackerTag')
@@ -103,17 +110,39 @@ class ClanWarAttack:
 
 
 class WarParticipant:
+    __slots__ = (
+        'tag', 'name', 'map_position', 'current_war_position', 'townhall_level', 'opponent_attacks', 'raw_attacks',
+        'raw_best_opponent_attack', '_attacks', '_best_opponent_attack'
+    )
+
     def __init__(self, raw_participant, current_war_position = None) -> None:
         self.tag: str = raw_participant['tag']
         self.name: str = raw_participant['name']
         self.map_position: int = raw_participant.get('mapPosition')
         self.current_war_position: int = current_war_position
         self.townhall_level: int = raw_participant.get('townhallLevel')
-        self.attacks = list(map(ClanWarAttack, raw_participant.get('attacks', [])))
         self.opponent_attacks: int = raw_participant.get('opponentAttacks')
-        self.best_opponent_attack = None
-        if self.opponent_attacks:
-            self.best_opponent_attack = ClanWarAttack(raw_participant.get('bestOpponentAttack'))
+        # Attacks are only decoded when accessed
+        self.raw_attacks: list[dict] = raw_participant.get('attacks', [])
+        self.raw_best_opponent_attack: Optional[dict] = raw_participant.get('bestOpponentAttack')
+        self._attacks: Optional[list[ClanWarAttack]] = None
+        self._best_opponent_attack: Optional[ClanWarAttack] = None
+
+    @property
+    def attacks(self) -> list[ClanWarAttack]:
+        if self._attacks is None:
+            self._attacks = list(map(ClanWarAttack, self.raw_attacks))
+        return self._attacks
+
+    @property
+    def attacks_count(self) -> int:
+        return len(self.raw_attacks)
+
+    @property
+    def best_opponent_attack(self) -> Optional[ClanWarAttack]:
+        if self._best_opponent_attack is None and self.opponent_attacks and self.raw_best_opponent_attack is not None:
+            self._best_opponent_attack = ClanWarAttack(self.raw_best_opponent_attack)
+        return self._best_opponent_attack
 
     def str_as_defender(self, use_custom_emojis) -> str:
         townhall = self.str_townhall(use_custom_emojis)
@@ -126,7 +155,7 @@ class WarParticipant:
         return s
 
     def missing_attacks_str(self, attacks_per_member, use_custom_emojis, show_townhall_level = False) -> str:
-        s = f'`{self.current_war_position or "?"}. {self.name}` ({len(self.attacks)}/{attacks_per_member})'
+        s = f'`{self.current_war_position or "?"}. {self.name}` ({self.attacks_count}/{attacks_per_member})'
         if show_townhall_level:
             s = f'{self.str_townhall(use_custom_emojis)} - {s}'
         return s
@@ -138,6 +167,11 @@ class WarParticipant:
 
 
 class WarClan:
+    __slots__ = (
+        'destruction_percentage', 'tag', 'name', 'clan_level', 'attacks', 'stars', 'exp_earned', 'raw_members',
+        '_members'
+    )
+
     def __init__(self, raw_war_clan) -> None:
         self.destruction_percentage: float = round(raw_war_clan.get('destructionPercentage'), 2)
         self.tag: str = raw_war_clan.get('tag')
@@ -146,9 +180,21 @@ class WarClan:
         self.attacks: int = raw_war_clan.get('attacks')
         self.stars: int = raw_war_clan.get('stars')
         self.exp_earned: int = raw_war_clan.get('expEarned')
-        self.members = [WarParticipant(member, idx + 1) for idx, member in enumerate(
-            sorted(raw_war_clan.get('members', []), key=lambda m: m['mapPosition'])
-        )]
+        # Members are only decoded when accessed
+        self.raw_members: list[dict] = raw_war_clan.get('members', [])
+        self._members: Optional[list[WarParticipant]] = None
+
+    @property
+    def members(self) -> list[WarParticipant]:
+        if self._members is None:
+            self._members = [WarParticipant(member, idx + 1) for idx, member in enumerate(
+                sorted(self.raw_members, key=lambda m: m['mapPosition'])
+            )]
+        return self._members
+
+    @property
+    def members_count(self) -> int:
+        return len(self.raw_members)
 
     def __eq__(self, other_war_clan) -> bool:
         if self.tag != other_war_clan.tag or self.name != other_war_clan.name:
@@ -161,7 +207,13 @@ class WarClan:
 
 
 class War:
+    __slots__ = (
+        'raw', 'state', 'clan', 'opponent', 'team_size', 'battle_modifier', 'preparation_start_time', 'war_start_time',
+        'end_time', 'is_cwl', 'attacks_per_member', 'attacks_per_clan', 'league_day', 'tag'
+    )
+
     def __init__(self, raw_clan: dict, is_cwl = False, tag: Optional[str] = None) -> None:
+        self.raw = raw_clan
         self.state: str = raw_clan['state']
         self.clan = WarClan(raw_clan['clan'])
         self.opponent = WarClan(raw_clan['opponent'])
@@ -236,7 +288,7 @@ class War:
             missing_attacks = [
                 m.missing_attacks_str(self.attacks_per_member, use_custom_emojis)
                 for m in self.clan.members
-                if len(m.attacks) <self.attacks_per_member
+                if m.attacks_count < self.attacks_per_member
             ]
             if len(missing_attacks) > 0:
                 missing_attacks_str = '   **;**   '.join(missing_attacks)
@@ -304,9 +356,26 @@ class WarScore:
         self.stars = stars
         self.destruction_percentage = destruction_percentage
 
+    @classmethod
+    def from_war(cls, war: War, war_clan: WarClan) -> 'WarScore':
+        # Contribution of a single war to the league score of one of its clans
+        score = cls()
+        score.add_to_score(war_clan)
+        if war.state == 'warEnded':
+            opponent = war.opponent if war_clan is war.clan else war.clan
+            star_diff = war_clan.stars - opponent.stars
+            percent_diff = war_clan.destruction_percentage - opponent.destruction_percentage
+            if star_diff > 0 or star_diff == 0 and percent_diff > 0:
+                score.stars += 10
+        return score
+
     def add_to_score(self, war_clan: WarClan) -> None:
         self.stars += war_clan.stars
-        self.destruction_percentage += war_clan.destruction_percentage * len(war_clan.members)
+        self.destruction_percentage += war_clan.destruction_percentage * war_clan.members_count
+
+    def apply_delta(self, previous: 'WarScore', current: 'WarScore') -> None:
+        self.stars += current.stars - previous.stars
+        self.destruction_percentage += current.destruction_percentage - previous.destruction_percentage
 
     def __str__(self) -> str:
         return f':star: {self.stars} - {int(self.destruction_percentage)}%'
@@ -341,6 +410,9 @@ class Pet(Enum):
     ANGRY_JELLY = 'Angry Jelly'
 
 
+PET_NAMES = frozenset(pet.value for pet in Pet)
+
+
 class Clan:
     def __init__(self, raw_clan: dict) -> None:
         self.tag: str = raw_clan['tag']
@@ -355,24 +427,64 @@ class Clan:
 class Player:
     class Hero:
         class Equipment:
+            __slots__ = ('level', 'max_level')
+
             def __init__(self, raw_equipment: dict) -> None:
                 self.level: int = raw_equipment['level']
                 self.max_level: int = raw_equipment['maxLevel']
 
+        __slots__ = ('level', 'max_level', 'village', 'raw_equipment', '_equipment')
+
         def __init__(self, raw_hero: dict) -> None:
             self.level: int = raw_hero['level']
             self.max_level: int = raw_hero['maxLevel']
             self.village: str = raw_hero['village']
-            self.equipment = list(map(Player.Hero.Equipment, raw_hero.get('equipment', [])))
+            self.raw_equipment: list[dict] = raw_hero.get('equipment', [])
+            self._equipment: Optional[list[Player.Hero.Equipment]] = None
+
+        @property
+        def equipment(self) -> list['Player.Hero.Equipment']:
+            if self._equipment is None:
+                self._equipment = list(map(Player.Hero.Equipment, self.raw_equipment))
+            return self._equipment
 
     class Troop:
+        __slots__ = ('level', 'max_level', 'name')
+
         def __init__(self, raw_troop: dict) -> None:
             self.level: int = raw_troop['level']
             self.max_level: int = raw_troop['maxLevel']
-            self.name: int = raw_troop['name']
+            self.name: str = raw_troop['name']
+
+    __slots__ = ('raw_troops', 'raw_heroes', '_pets', '_troops', '_heroes')
 
     def __init__(self, raw_player: dict) -> None:
-        all_troops = map(Player.Troop, raw_player['troops'])
-        self.pets = list(filter(lambda t: t.name in Pet, all_troops))
-        self.troops = list(filter(lambda t: t.name not in Pet, all_troops))
-        self.heroes = list(map(Player.Hero, raw_player['heroes']))
+        # Troops and heroes are only decoded when accessed
+        self.raw_troops: list[dict] = raw_player['troops']
+        self.raw_heroes: list[dict] = raw_player['heroes']
+        self._pets: Optional[list[Player.Troop]] = None
+        self._troops: Optional[list[Player.Troop]] = None
+        self._heroes: Optional[list[Player.Hero]] = None
+
+    def decode_troops(self) -> None:
+        all_troops = list(map(Player.Troop, self.raw_troops))
+        self._pets = [t for t in all_troops if t.name in PET_NAMES]
+        self._troops = [t for t in all_troops if t.name not in PET_NAMES]
+
+    @property
+    def pets(self) -> list[Troop]:
+        if self._pets is None:
+            self.decode_troops()
+        return self._pets or []
+
+    @property
+    def troops(self) -> list[Troop]:
+        if self._troops is None:
+            self.decode_troops()
+        return self._troops or []
+
+    @property
+    def heroes(self) -> list[Hero]:
+        if self._heroes is None:
+            self._heroes = list(map(Player.Hero, self.raw_heroes))
+        return self._heroes
@@ -1,14 +1,20 @@
-from typing import Optional
+import re
+from typing import Any, Optional
 from enum import Enum
-import json
+from utils.json_codec import json_loads, json_dumps
 
 
 class EventType(Enum):
     READY = 'READY'
+    RESUMED = 'RESUMED'
     MESSAGE_CREATE = 'MESSAGE_CREATE'
     MESSAGE_UPDATE = 'MESSAGE_UPDATE'
 
 
+WS_MESSAGE_HEADER_REGEX = re.compile(r'"(op|t|s)"\s*:\s*(\d+|null|"([A-Z_]+)")')
+MESSAGE_CONTENT_REGEX = re.compile(r'"content"\s*:\s*"\s*')
+
+
 class WsMessageType(Enum):
     # Send/Receive
     HEARTBEAT = 1
@@ -30,20 +36,53 @@ class WsMessageType(Enum):
 
 
 class WsMessage:
-    def __init__(self, op: int, data: Optional[dict] = None, event_name = None, sequence_number = None):
+    def __init__(self, op: int, data: Any = None, event_name = None, sequence_number = None):
         self.operation = op
-        self.data = {} if data is None else data
+        self.data = data  # A dict for most operations, the last sequence number (or null) for heartbeats
         self.event_name: Optional[str] = event_name
         self.sequence_number: Optional[int] = sequence_number
 
     @classmethod
-    def parse(cls, string_message: str):
-        raw_message = json.loads(string_message)
+    def parse(cls, string_message: str | bytes):
+        raw_message = json_loads(string_message)
         return cls(raw_message['op'], raw_message['d'], raw_message['t'], raw_message['s'])
 
+    @staticmethod
+    def peek(string_message: str | bytes) -> Optional[tuple[int, Optional[str], Optional[int]]]:
+        # Reads op, t and s without decoding the payload. They are only trusted when they come before the 'd' key,
+        # otherwise they may belong to the payload and None is returned
+        if isinstance(string_message, bytes):
+            data_index = string_message.find(b'"d"')
+            header = string_message[:data_index].decode() if data_index >= 0 else string_message.decode()
+        else:
+            data_index = string_message.find('"d"')
+            header = string_message[:data_index] if data_index >= 0 else string_message
+        fields: dict[str, Optional[str]] = {}
+        for match in WS_MESSAGE_HEADER_REGEX.finditer(header):
+            key, value, event_name = match.groups()
+            fields[key] = event_name if event_name is not None else (None if value == 'null' else value)
+        if len(fields) < 3 or fields['op'] is None:
+            return None
+        sequence_number = fields['s']
+        return int(fields['op']), fields['t'], int(sequence_number) if sequence_number is not None else None
+
+    @staticmethod
+    def may_have_content_starting_with(string_message: str | bytes, prefix: str) -> bool:
+        # False only when no 'content' field of the payload (referenced messages have one too) starts with the prefix
+        if isinstance(string_message, bytes):
+            string_message = string_message.decode()
+        for match in MESSAGE_CONTENT_REGEX.finditer(string_message):
+            value_start = string_message[match.end():match.end() + len(prefix)]
+            if value_start.startswith(prefix) or value_start.startswith('\\'):  # Escaped characters are not checked
+                return True
+        return False
+
     def to_dict(self) -> dict:
         return {'op': self.operation, 'd': self.data, 't': self.event_name, 's': self.sequence_number}
 
+    def to_json(self) -> str:
+        return json_dumps(self.to_dict())
+
 
 class User:
     def __init__(self, raw_user: dict) -> None:
@@ -2,3 +2,6 @@ from .command_uses_repository import CommandUsesRepository
 from .discord_coc_links_repository import DiscordCocLinksRepository
 from .troop_givers_repository import TroopGiversRepository
 from .whitelists_repository import WhitelistsRepository
+from .wars_repository import WarsRepository
+from .migrations import run_migrations
+from .write_behind_queue import WriteBehindQueue
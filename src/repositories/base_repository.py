@@ -1,10 +1,12 @@
 from abc import abstractmethod
 from .db_connection import DbConnection
+from .write_behind_queue import WriteBehindQueue
 
 
 class BaseRepository:
     def __init__(self):
         self.db_connection = DbConnection()
+        self.write_behind_queue = WriteBehindQueue()
         self.init_table()
 
     @abstractmethod
@@ -1,3 +1,4 @@
+from datetime import datetime, timezone
 from typing import Optional
 from .base_repository import BaseRepository
 
@@ -7,7 +8,7 @@ class CommandUsesRepository(BaseRepository):
         super().__init__()
 
     def init_table(self):
-        self.db_connection.query('''
+        self.db_connection.query_sync('''
             CREATE TABLE IF NOT EXISTS `command_uses` (
                 `id` integer NOT NULL,
                 `discord_user_id` varchar(20) NOT NULL,
@@ -18,13 +19,15 @@ class CommandUsesRepository(BaseRepository):
         ''')
 
     def insert_command_use(self, discord_user_id: str, command: str) -> None:
-        self.db_connection.query(
-            'INSERT INTO `command_uses` (`discord_user_id`, `command`) VALUES (?, ?)',
-            (discord_user_id, command)
+        # Written later: the use time is set now, in the CURRENT_TIMESTAMP format
+        self.write_behind_queue.put(
+            'INSERT INTO `command_uses` (`discord_user_id`, `command`, `used_at`) VALUES (?, ?, ?)',
+            (discord_user_id, command, datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'))
         )
 
-    def get_last_command_use_time(self, discord_user_id: str) -> Optional[str]:
-        return self.db_connection.quick_lookup(
-            'SELECT `used_at` FROM `command_uses` WHERE `discord_user_id` = ?',
+    async def get_last_command_use_time(self, discord_user_id: str) -> Optional[str]:
+        await self.write_behind_queue.flush()
+        return await self.db_connection.quick_lookup(
+            'SELECT `used_at` FROM `command_uses` WHERE `discord_user_id` = ? ORDER BY `used_at` DESC LIMIT 1',
             (discord_user_id,)
         )
@@ -1,39 +1,108 @@
+import asyncio
+import os
 import sqlite3 as sql
-from typing import Any, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from dotenv import load_dotenv
+
+
+DB_FILE = '.coc-bot.db'
+load_dotenv()
+# NORMAL is safe with WAL: only the last transactions may be lost on power failure
+DB_SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+DB_SYNCHRONOUS = os.environ.get('DB_SYNCHRONOUS', 'NORMAL').upper()
+if DB_SYNCHRONOUS not in DB_SYNCHRONOUS_MODES:
+    DB_SYNCHRONOUS = 'NORMAL'
+DB_READERS_COUNT = 2
+CACHED_STATEMENTS = 256  # Prepared statements kept by each connection, by query text
 
 
 class DbConnection:
+    # Queries run off the event loop: writes on a single thread, reads on a small pool (WAL lets them run while
+    # writing). Each thread keeps its own connection, and so its prepared statements
     instance = None
 
     def __new__(cls):
         if cls.instance is None:
             cls.instance = super().__new__(cls)
-            cls.db_connection = sql.connect('.coc-bot.db')
+            cls.local = threading.local()
+            cls.writer = ThreadPoolExecutor(1, thread_name_prefix='db-writer')
+            cls.readers = ThreadPoolExecutor(DB_READERS_COUNT, thread_name_prefix='db-reader')
+            cls.instance.run_sync(cls.instance.get_connection)  # Switches to WAL before any reader connects
         return cls.instance
 
-    def quick_lookup(self, query: str, params) -> Optional[Any]:
-        record = self.first_record_lookup(query, params)
-        if record is None or len(record) == 0:
-            return None
-        return record[0]
+    def get_connection(self) -> sql.Connection:
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sql.connect(DB_FILE, cached_statements=CACHED_STATEMENTS)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(f'PRAGMA synchronous={DB_SYNCHRONOUS}')
+            self.local.connection = connection
+        return connection
+
+    def run_sync(self, func: Callable, *args) -> Any:
+        # Blocks until done, only meant for startup
+        return self.writer.submit(func, *args).result()
 
-    def first_record_lookup(self, query: str, params) -> Optional[tuple]:
-        cursor = self.db_connection.cursor()
-        cursor.execute(query, params)
-        return cursor.fetchone()
+    async def read(self, func: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.readers, func, *args)
 
-    def record_lookup(self, query: str, params = None) -> list[tuple]:
-        cursor = self.db_connection.cursor()
+    async def write(self, func: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.writer, func, *args)
+
+    # Run on the DB threads
+
+    def fetch_one(self, query: str, params) -> Optional[tuple]:
+        return self.get_connection().execute(query, params).fetchone()
+
+    def fetch_all(self, query: str, params = None) -> list[tuple]:
         if params is None:
-            cursor.execute(query)
-        else:
-            cursor.execute(query, params)
-        return cursor.fetchall()
+            return self.get_connection().execute(query).fetchall()
+        return self.get_connection().execute(query, params).fetchall()
 
-    def query(self, query: str, params = None) -> None:
-        cursor = self.db_connection.cursor()
+    def execute(self, query: str, params = None) -> None:
+        connection = self.get_connection()
         if params is None:
-            cursor.execute(query)
+            connection.execute(query)
         else:
-            cursor.execute(query, params)
-        self.db_connection.commit()
+            connection.execute(query, params)
+        connection.commit()
+
+    def execute_batch(self, statements: list[tuple[str, list]]) -> None:
+        # All the statements in a single transaction
+        connection = self.get_connection()
+        try:
+            for query, params_list in statements:
+                connection.executemany(query, params_list)
+            connection.commit()
+        except Exception as e:
+            connection.rollback()
+            raise e
+
+    # Async API
+
+    async def quick_lookup(self, query: str, params) -> Optional[Any]:
+        record = await self.first_record_lookup(query, params)
+        if record is None or len(record) == 0:
+            return None
+        return record[0]
+
+    async def first_record_lookup(self, query: str, params) -> Optional[tuple]:
+        return await self.read(self.fetch_one, query, params)
+
+    async def record_lookup(self, query: str, params = None) -> list[tuple]:
+        return await self.read(self.fetch_all, query, params)
+
+    async def query(self, query: str, params = None) -> None:
+        await self.write(self.execute, query, params)
+
+    async def query_many(self, query: str, params_list: list) -> None:
+        await self.write(self.execute_batch, [(query, params_list)])
+
+    async def query_batch(self, statements: list[tuple[str, list]]) -> None:
+        await self.write(self.execute_batch, statements)
+
+    def query_sync(self, query: str, params = None) -> None:
+        # For the table creations, when repositories are created
+        self.run_sync(self.execute, query, params)
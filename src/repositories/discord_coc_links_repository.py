@@ -2,12 +2,16 @@ from typing import Optional
 from .base_repository import BaseRepository
 
 
+MAX_QUERY_PARAMS = 500  # Below SQLite's limit of bound parameters
+
+
 class DiscordCocLinksRepository(BaseRepository):
-    def __init__(self):
+    def __init__(self, on_link_insert = None):
         super().__init__()
+        self.on_link_insert = on_link_insert
 
     def init_table(self):
-        self.db_connection.query('''
+        self.db_connection.query_sync('''
             CREATE TABLE IF NOT EXISTS `discord_coc_links` (
                 `discord_user_id` varchar(20) NOT NULL,
                 `coc_player_tag` varchar(20) NOT NULL,
@@ -15,22 +19,54 @@ class DiscordCocLinksRepository(BaseRepository):
             );
         ''')
 
-    def insert_discord_account_player_tag(self, discord_user_id: str, coc_player_tag: str) -> None:
-        self.db_connection.query(
+    async def insert_discord_account_player_tag(self, discord_user_id: str, coc_player_tag: str) -> None:
+        await self.db_connection.query(
             '''INSERT INTO `discord_coc_links` (`discord_user_id`, `coc_player_tag`) VALUES (?, ?)
             ON CONFLICT DO NOTHING''',
             (discord_user_id, coc_player_tag)
         )
+        if self.on_link_insert is not None:
+            self.on_link_insert(discord_user_id, coc_player_tag)
+
+    async def get_links(self) -> list[tuple[str, str]]:
+        return await self.db_connection.record_lookup(
+            'SELECT `discord_user_id`, `coc_player_tag` FROM `discord_coc_links`'
+        )
 
-    def get_discord_id_from_player_tag(self, coc_player_tag: str) -> Optional[str]:
-        return self.db_connection.quick_lookup(
+    async def get_discord_id_from_player_tag(self, coc_player_tag: str) -> Optional[str]:
+        return await self.db_connection.quick_lookup(
             'SELECT `discord_user_id` FROM `discord_coc_links` WHERE `coc_player_tag` = ?',
             (coc_player_tag, )
         )
 
-    def get_player_tags_from_discord_id(self, discord_id: str) -> list[str]:
+    async def get_discord_ids_from_player_tags(self, coc_player_tags: list[str]) -> dict[str, str]:
+        # Discord user ID of each linked player tag, one query per 500 tags
+        discord_ids: dict[str, str] = {}
+        for i in range(0, len(coc_player_tags), MAX_QUERY_PARAMS):
+            chunk = coc_player_tags[i:i + MAX_QUERY_PARAMS]
+            for discord_user_id, coc_player_tag in await self.db_connection.record_lookup(
+                f'''SELECT `discord_user_id`, `coc_player_tag` FROM `discord_coc_links`
+                WHERE `coc_player_tag` IN ({', '.join('?' * len(chunk))})''',
+                chunk
+            ):
+                discord_ids.setdefault(coc_player_tag, discord_user_id)
+        return discord_ids
+
+    async def get_linked_discord_ids(self, discord_ids: list[str]) -> set[str]:
+        # Those of the given Discord user IDs that are linked to at least one player tag
+        linked_discord_ids: set[str] = set()
+        for i in range(0, len(discord_ids), MAX_QUERY_PARAMS):
+            chunk = discord_ids[i:i + MAX_QUERY_PARAMS]
+            linked_discord_ids.update(record[0] for record in await self.db_connection.record_lookup(
+                f'''SELECT DISTINCT `discord_user_id` FROM `discord_coc_links`
+                WHERE `discord_user_id` IN ({', '.join('?' * len(chunk))})''',
+                chunk
+            ))
+        return linked_discord_ids
+
+    async def get_player_tags_from_discord_id(self, discord_id: str) -> list[str]:
         return [
-            record[0] for record in self.db_connection.record_lookup(
+            record[0] for record in await self.db_connection.record_lookup(
                 'SELECT `coc_player_tag` FROM `discord_coc_links` WHERE `discord_user_id` = ?',
                 (discord_id, )
             )
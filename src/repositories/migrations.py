@@ -0,0 +1,58 @@
+from utils import log, LogLevel
+from .db_connection import DbConnection
+
+
+class Migration:
+    def __init__(self, version: int, description: str, statements: list[str]) -> None:
+        self.version = version
+        self.description = description
+        self.statements = statements
+
+
+# Ordered by version, applied after the repositories created their tables. Never edit an applied migration
+MIGRATIONS = [
+    Migration(1, 'Index Discord accounts by player tag', [
+        'CREATE INDEX IF NOT EXISTS `discord_coc_links_coc_player_tag` ON `discord_coc_links` (`coc_player_tag`)'
+    ]),
+    Migration(2, 'Index command uses by user and use time', [
+        '''CREATE INDEX IF NOT EXISTS `command_uses_discord_user_id_used_at`
+        ON `command_uses` (`discord_user_id`, `used_at`)'''
+    ]),
+]
+
+
+def apply_migrations(db_connection: DbConnection) -> list[Migration]:
+    # Run on the DB writer thread: all the pending migrations are applied in a single transaction
+    connection = db_connection.get_connection()
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS `schema_migrations` (
+            `version` integer NOT NULL,
+            `description` text NOT NULL,
+            `applied_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (`version`)
+        );
+    ''')
+    current_version = connection.execute('SELECT MAX(`version`) FROM `schema_migrations`').fetchone()[0] or 0
+    pending_migrations = [m for m in MIGRATIONS if m.version > current_version]
+    if len(pending_migrations) == 0:
+        return []
+    connection.execute('BEGIN')  # Otherwise schema changes are committed one by one
+    try:
+        for migration in pending_migrations:
+            for statement in migration.statements:
+                connection.execute(statement)
+            connection.execute(
+                'INSERT INTO `schema_migrations` (`version`, `description`) VALUES (?, ?)',
+                (migration.version, migration.description)
+            )
+        connection.commit()
+    except Exception as e:
+        connection.rollback()
+        raise e
+    return pending_migrations
+
+
+def run_migrations() -> None:
+    db_connection = DbConnection()
+    for migration in db_connection.run_sync(apply_migrations, db_connection):
+        log(f'Applied migration {migration.version}: {migration.description}', LogLevel.INFO)
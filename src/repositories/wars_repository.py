@@ -0,0 +1,91 @@
+from typing import Optional
+
+from models.clash_of_clans import War
+from utils import json_loads, json_dumps
+from .base_repository import BaseRepository
+
+
+class WarsRepository(BaseRepository):
+    def __init__(self):
+        super().__init__()
+
+    def init_table(self):
+        self.db_connection.query_sync('''
+            CREATE TABLE IF NOT EXISTS `wars` (
+                `war_key` varchar(40) NOT NULL,
+                `war_tag` varchar(20),
+                `clan_tag` varchar(20) NOT NULL,
+                `opponent_tag` varchar(20) NOT NULL,
+                `preparation_start_time` varchar(20),
+                `league_day` integer,
+                `raw_war` text NOT NULL,
+                PRIMARY KEY (`war_key`)
+            );
+        ''')
+        self.db_connection.query_sync('''
+            CREATE TABLE IF NOT EXISTS `war_attacks` (
+                `war_key` varchar(40) NOT NULL,
+                `order` integer NOT NULL,
+                `attacker_tag` varchar(20) NOT NULL,
+                `defender_tag` varchar(20) NOT NULL,
+                `stars` integer NOT NULL,
+                `destruction_percentage` real NOT NULL,
+                `duration` integer,
+                PRIMARY KEY (`war_key`, `order`)
+            );
+        ''')
+
+    @staticmethod
+    def get_war_key(war: War) -> str:
+        # CWL wars have a tag, regular wars are identified by the clan and the preparation start time
+        if war.tag is not None:
+            return war.tag
+        return f'{war.clan.tag}{war.preparation_start_time}'
+
+    async def insert_war(self, war: War) -> None:
+        war_key = self.get_war_key(war)
+        await self.db_connection.query(
+            '''INSERT INTO `wars`
+            (`war_key`, `war_tag`, `clan_tag`, `opponent_tag`, `preparation_start_time`, `league_day`, `raw_war`)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO UPDATE SET `league_day` = EXCLUDED.`league_day`, `raw_war` = EXCLUDED.`raw_war`''',
+            (
+                war_key,
+                war.tag,
+                war.clan.tag,
+                war.opponent.tag,
+                war.preparation_start_time,
+                war.league_day,
+                json_dumps(war.raw)
+            )
+        )
+        await self.db_connection.query_many(
+            '''INSERT INTO `war_attacks`
+            (`war_key`, `order`, `attacker_tag`, `defender_tag`, `stars`, `destruction_percentage`, `duration`)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO NOTHING''',
+            [
+                (war_key, a.order, a.attacker_tag, a.defender_tag, a.stars, a.destruction_percentage, a.duration)
+                for war_clan in (war.clan, war.opponent)
+                for member in war_clan.members
+                for a in member.attacks
+            ]
+        )
+
+    async def get_war_by_key(self, war_key: str) -> Optional[War]:
+        record = await self.db_connection.first_record_lookup(
+            'SELECT `war_tag`, `league_day`, `raw_war` FROM `wars` WHERE `war_key` = ?',
+            (war_key,)
+        )
+        if record is None:
+            return None
+        war_tag, league_day, raw_war = record
+        war = War(json_loads(raw_war), is_cwl = war_tag is not None, tag = war_tag)
+        war.league_day = league_day
+        return war
+
+    async def get_cwl_war(self, war_tag: str) -> Optional[War]:
+        return await self.get_war_by_key(war_tag)
+
+    async def get_regular_war(self, clan_tag: str, preparation_start_time: str) -> Optional[War]:
+        return await self.get_war_by_key(f'{clan_tag}{preparation_start_time}')
@@ -5,9 +5,16 @@ from .base_repository import BaseRepository
 class WhitelistsRepository(BaseRepository):
     def __init__(self):
         super().__init__()
+        # Whitelists rarely change: they are read once, then kept up to date by the writes of this repository
+        self.whitelisted_ids: dict[str, set[str]] = {'CHANNEL': set(), 'GUILD': set()}
+        for object_id, object_type in self.db_connection.run_sync(
+            self.db_connection.fetch_all,
+            'SELECT `object_id`, `object_type` FROM `whitelists` WHERE `is_whitelisted` = 1'
+        ):
+            self.whitelisted_ids[object_type].add(object_id)
 
     def init_table(self):
-        self.db_connection.query('''
+        self.db_connection.query_sync('''
             CREATE TABLE IF NOT EXISTS `whitelists` (
                 `object_id` varchar(20) NOT NULL,
                 `object_type` varchar(7) NOT NULL,
@@ -16,17 +23,22 @@ class WhitelistsRepository(BaseRepository):
             );
         ''')
 
-    def insert_whitelist(self, object_id: str, object_type: Literal['CHANNEL', 'GUILD']) -> None:
-        self.db_connection.query(
+    async def insert_whitelist(self, object_id: str, object_type: Literal['CHANNEL', 'GUILD']) -> None:
+        await self.db_connection.query(
             '''INSERT INTO `whitelists` (`object_id`, `object_type`, `is_whitelisted`) VALUES (?, ?, 1)
             ON CONFLICT DO UPDATE SET `is_whitelisted` = 1''',
             (object_id, object_type)
         )
+        self.whitelisted_ids[object_type].add(object_id)
+
+    async def remove_whitelist(self, object_id: str, object_type: Literal['CHANNEL', 'GUILD']) -> None:
+        await self.db_connection.query(
+            'UPDATE `whitelists` SET `is_whitelisted` = 0 WHERE `object_id` = ? AND `object_type` = ?',
+            (object_id, object_type)
+        )
+        self.whitelisted_ids[object_type].discard(object_id)
 
     def is_whitelisted(self, channel_id: str, guild_id: Optional[str] = None) -> bool:
-        query = "SELECT `is_whitelisted` FROM `whitelists` WHERE `object_id` = ? AND `object_type` = 'CHANNEL'"
-        params: tuple = (channel_id,)
-        if guild_id is not None:
-            params += (guild_id,)
-            query += " OR `object_id` = ? AND `object_type` = 'GUILD'"
-        return self.db_connection.quick_lookup(query, params) == 1
+        if channel_id in self.whitelisted_ids['CHANNEL']:
+            return True
+        return guild_id is not None and guild_id in self.whitelisted_ids['GUILD']
@@ -0,0 +1,84 @@
+import asyncio
+from itertools import groupby
+from typing import Optional
+
+from utils import log, LogLevel
+from .db_connection import DbConnection
+
+
+FLUSH_INTERVAL = 5  # seconds
+FLUSH_SIZE = 100  # queued writes
+MAX_FLUSH_ATTEMPTS = 3  # Failing writes are dropped after that, so that they don't block the next ones forever
+
+
+class WriteBehindQueue:
+    # Writes that nothing reads right away are grouped in one transaction, flushed every few seconds, once enough
+    # of them are queued, and on shutdown
+    instance = None
+
+    def __new__(cls):
+        if cls.instance is None:
+            cls.instance = super().__new__(cls)
+            cls.instance.db_connection = DbConnection()
+            cls.instance.pending = []
+            cls.instance.scheduled_flush = None
+            cls.instance.flush_task = None
+            cls.instance.failed_flushes = 0
+        return cls.instance
+
+    db_connection: DbConnection
+    pending: list[tuple[str, tuple]]
+    scheduled_flush: Optional[asyncio.TimerHandle]
+    flush_task: Optional[asyncio.Task]  # Referenced so that it isn't garbage collected while running
+    failed_flushes: int  # In a row
+
+    def put(self, query: str, params: tuple) -> None:
+        # Never blocks
+        self.pending.append((query, params))
+        if len(self.pending) >= FLUSH_SIZE:
+            self.create_flush_task()
+        else:
+            self.schedule_flush()
+
+    def schedule_flush(self) -> None:
+        if self.scheduled_flush is None:
+            event_loop = asyncio.get_running_loop()
+            self.scheduled_flush = event_loop.call_later(FLUSH_INTERVAL, self.create_flush_task)
+
+    def create_flush_task(self) -> None:
+        # A single flush at a time: the writes queued meanwhile are flushed once it is done
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.flush())
+
+    async def close(self) -> None:
+        if self.flush_task is not None:
+            await self.flush_task
+        await self.flush()
+        if self.scheduled_flush is not None:
+            self.scheduled_flush.cancel()
+            self.scheduled_flush = None
+
+    async def flush(self) -> None:
+        if self.scheduled_flush is not None:
+            self.scheduled_flush.cancel()
+            self.scheduled_flush = None
+        if len(self.pending) == 0:
+            return
+        pending, self.pending = self.pending, []
+        # Consecutive writes of the same query are executed together, the order is kept
+        statements = [
+            (query, [params for _, params in writes]) for query, writes in groupby(pending, key = lambda w: w[0])
+        ]
+        try:
+            await self.db_connection.query_batch(statements)
+            self.failed_flushes = 0
+        except Exception as e:
+            self.failed_flushes += 1
+            if self.failed_flushes < MAX_FLUSH_ATTEMPTS:
+                log(f'Failed to write {len(pending)} queued writes, retrying: {e}', LogLevel.WARNING)
+                self.pending = pending + self.pending  # Still before the writes queued meanwhile
+            else:
+                log(f'Failed to write {len(pending)} queued writes, dropping them: {e}', LogLevel.ERROR)
+                self.failed_flushes = 0
+        if len(self.pending) > 0:
+            self.schedule_flush()
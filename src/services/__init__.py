@@ -1,3 +1,4 @@
 from .clan_members import ClanMembersService
 from .clan_wars import ClanWarsService
 from .capital_raids import CapitalRaidsService
+from .clan_role_index import ClanRoleIndex
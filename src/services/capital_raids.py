@@ -1,8 +1,7 @@
 import asyncio
-from time import time
 from datetime import datetime
 from typing import Optional
-from clients import ClashOfClansApiClient, DiscordApiClient
+from clients import ClashOfClansApiClient, DiscordApiClient, create_background_task
 from models.clash_of_clans import CapitalRaidSeason
 from utils import log, LogLevel
 
@@ -20,7 +19,6 @@ class CapitalRaidsService:
         self.discord_api_client = discord_api_client
 
         self.current_capital_raid_season: Optional[CapitalRaidSeason] = None
-        self.raid_last_fetched_at: Optional[float] = None
         self.raid_fetch_next_task: Optional[asyncio.TimerHandle] = None
         self.on_current_raid_change = on_current_raid_change
 
@@ -34,14 +32,11 @@ class CapitalRaidsService:
             self.raid_fetch_next_task = event_loop.call_later(duration, self.create_next_raid_season_fetch_task)
 
     async def get_current_capital_raid_season(self):
-        if self.raid_last_fetched_at is not None and time() - self.raid_last_fetched_at < 3:
-            return self.current_capital_raid_season
         current_season = await self.coc_api_client.get_current_capital_raid_season(self.clan_tag)
         if current_season is not None:
             if self.on_current_raid_change is not None and self.current_capital_raid_season != current_season:
                 await self.on_current_raid_change(current_season)
             self.current_capital_raid_season = current_season
-            self.raid_last_fetched_at = time()
             log('Succesfully fetched capital raid', LogLevel.INFO)
             event_loop = asyncio.get_event_loop()
             if self.raid_fetch_next_task is not None:
@@ -50,4 +45,4 @@ class CapitalRaidsService:
             return current_season
 
     def create_next_raid_season_fetch_task(self):
-        asyncio.create_task(self.get_current_capital_raid_season())
+        create_background_task(self.get_current_capital_raid_season())
@@ -1,10 +1,8 @@
-from time import time
 from typing import Optional, Callable
 
 from models.clash_of_clans import ClanMember
 from clients import ClashOfClansApiClient, DiscordApiClient
 from i18n import __
-from utils import log, LogLevel
 
 
 CLAN_MAIN_CHANNEL_ID = '1327513254473236481'
@@ -12,32 +10,36 @@ CLAN_MEMBERS_WARNING_THRESHOLD = 49
 
 
 class ClanMembersService:
-    def __init__(self, clan_tag: str, coc_api_client: ClashOfClansApiClient, discord_api_client: DiscordApiClient):
+    def __init__(
+        self,
+        clan_tag: str,
+        coc_api_client: ClashOfClansApiClient,
+        discord_api_client: DiscordApiClient,
+        on_clan_members_change = None
+    ):
         self.clan_tag = clan_tag
         self.coc_api_client = coc_api_client
         self.discord_api_client = discord_api_client
+        self.on_clan_members_change = on_clan_members_change
         self.clan_members: list[ClanMember] = []
-        self.members_last_fetched_at: Optional[float] = None
 
     async def get_clan_members(
         self,
-        custom_ping_filter: Optional[Callable[[ClanMember], bool]] = None,
-        force_fetch = False
+        custom_ping_filter: Optional[Callable[[ClanMember], bool]] = None
     ) -> list[ClanMember]:
-        must_refresh = self.members_last_fetched_at is None or time() - self.members_last_fetched_at > 28800
-        if force_fetch or len(self.clan_members) == 0 or must_refresh:  # 8 hours
-            clan_members = await self.coc_api_client.get_clan_members(self.clan_tag)
-            members_count = len(clan_members)
-            if members_count > 0:
-                if 0 < len(self.clan_members) < members_count and members_count >= CLAN_MEMBERS_WARNING_THRESHOLD:
-                    warning_message = __('The Clan is almost full') if members_count < 50 else __('The Clan is full')
-                    await self.discord_api_client.send_message(
-                        CLAN_MAIN_CHANNEL_ID,
-                        f'**:warning: {warning_message} ({members_count}/50)**'
-                    )
-                self.clan_members = clan_members
-                self.members_last_fetched_at = time()
-                log('Succesfully fetched clan members', LogLevel.INFO)
+        # Responses are cached by the CoC API client for as long as the API allows (Cache-Control max-age)
+        clan_members = await self.coc_api_client.get_clan_members(self.clan_tag)
+        members_count = len(clan_members)
+        if members_count > 0:
+            if 0 < len(self.clan_members) < members_count and members_count >= CLAN_MEMBERS_WARNING_THRESHOLD:
+                warning_message = __('The Clan is almost full') if members_count < 50 else __('The Clan is full')
+                await self.discord_api_client.send_message(
+                    CLAN_MAIN_CHANNEL_ID,
+                    f'**:warning: {warning_message} ({members_count}/50)**'
+                )
+            self.clan_members = clan_members
+            if self.on_clan_members_change is not None:
+                await self.on_clan_members_change(self.clan_tag, clan_members)
         if custom_ping_filter is None:
             return self.clan_members
         return list(filter(custom_ping_filter, self.clan_members))
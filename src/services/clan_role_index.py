@@ -0,0 +1,79 @@
+from time import time
+from typing import Optional
+
+from models.clash_of_clans import ClanMember
+
+
+ROLE_INDEX_MAX_AGE = 300  # seconds, clan members are fetched again after that
+
+
+class ClanRoleIndex:
+    # Highest ranked clan member of each Discord user among their linked accounts, in all the indexed clans.
+    # Only the Discord users whose accounts changed are updated
+    def __init__(self) -> None:
+        self.clan_members: dict[str, dict[str, ClanMember]] = {}  # By clan tag, then by player tag
+        self.updated_at: dict[str, float] = {}  # By clan tag
+        self.player_tags: dict[str, set[str]] = {}  # Linked accounts of each Discord user
+        self.discord_ids: dict[str, set[str]] = {}  # By player tag, an account can be linked to several users
+        self.highest_members: dict[str, ClanMember] = {}  # By Discord user ID
+
+    def is_fresh(self, clan_tags: list[str]) -> bool:
+        return all(time() - self.updated_at.get(clan_tag, 0) < ROLE_INDEX_MAX_AGE for clan_tag in clan_tags)
+
+    def get_highest_member(self, discord_id: str) -> Optional[ClanMember]:
+        return self.highest_members.get(discord_id)
+
+    def add_link(self, discord_id: str, player_tag: str) -> None:
+        self.player_tags.setdefault(discord_id, set()).add(player_tag)
+        self.discord_ids.setdefault(player_tag, set()).add(discord_id)
+        self.update_discord_user(discord_id)
+
+    def set_links(self, links: list[tuple[str, str]]) -> None:
+        # Links are also added outside of the bot: all of them are reloaded, only the changed users are updated
+        player_tags: dict[str, set[str]] = {}
+        discord_ids: dict[str, set[str]] = {}
+        for discord_id, player_tag in links:
+            player_tags.setdefault(discord_id, set()).add(player_tag)
+            discord_ids.setdefault(player_tag, set()).add(discord_id)
+        changed_discord_ids = {
+            discord_id
+            for discord_id in player_tags.keys() | self.player_tags.keys()
+            if player_tags.get(discord_id) != self.player_tags.get(discord_id)
+        }
+        self.player_tags = player_tags
+        self.discord_ids = discord_ids
+        for discord_id in changed_discord_ids:
+            self.update_discord_user(discord_id)
+
+    def update_clan_members(self, clan_tag: str, members: list[ClanMember]) -> None:
+        previous_members = self.clan_members.get(clan_tag, {})
+        current_members = {member.tag: member for member in members}
+        self.clan_members[clan_tag] = current_members
+        self.updated_at[clan_tag] = time()
+        changed_discord_ids = set()
+        for player_tag in previous_members.keys() | current_members.keys():
+            if player_tag in self.discord_ids and self.has_changed(
+                previous_members.get(player_tag),
+                current_members.get(player_tag)
+            ):
+                changed_discord_ids.update(self.discord_ids[player_tag])
+        for discord_id in changed_discord_ids:
+            self.update_discord_user(discord_id)
+
+    @staticmethod
+    def has_changed(previous_member: Optional[ClanMember], current_member: Optional[ClanMember]) -> bool:
+        if previous_member is None or current_member is None:
+            return True
+        return previous_member.role != current_member.role or previous_member.name != current_member.name
+
+    def update_discord_user(self, discord_id: str) -> None:
+        members = [
+            clan_members[player_tag]
+            for clan_members in self.clan_members.values()
+            for player_tag in self.player_tags.get(discord_id, ())
+            if player_tag in clan_members
+        ]
+        if len(members) == 0:
+            self.highest_members.pop(discord_id, None)
+        else:
+            self.highest_members[discord_id] = max(members, key=lambda m: m.role.value)
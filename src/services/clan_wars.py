@@ -2,12 +2,14 @@ from typing import Optional
 import asyncio
 from time import time
 from models.clash_of_clans import War, CWLGroup, WarScore
-from clients import ClashOfClansApiClient, DiscordApiClient
-from utils import log, LogLevel, to_timestamp
+from clients import ClashOfClansApiClient, DiscordApiClient, create_background_task
+from repositories import WarsRepository
+from utils import log, LogLevel, to_timestamp, single_flight
 
 
 CLAN_MAIN_CHANNEL_ID = '1327513254473236481'
 CLAN_MEMBERS_WARNING_THRESHOLD = 49
+CWL_WARS_CONCURRENCY = 8
 
 
 class ClanWarsService:
@@ -21,28 +23,30 @@ class ClanWarsService:
         self.clan_tag = clan_tag
         self.coc_api_client = coc_api_client
         self.discord_api_client = discord_api_client
+        self.wars_repository = WarsRepository()
 
         self.current_war: Optional[War] = None
-        self.war_last_fetched_at: Optional[float] = None
         self.war_fetch_next_task: Optional[asyncio.TimerHandle] = None
         self.on_current_war_change = on_current_war_change
 
         # CWL
         self.current_cwl_group: Optional[CWLGroup] = None
-        self.cwl_last_fetched_at: Optional[float] = None
         self.league_end_time: Optional[float] = None
-        self.cwl_scores: dict[str, WarScore] = {}  # Keys are in the format '#WARTAG#CLANTAG'
+        self.cwl_season: Optional[str] = None
+        self.cwl_scores: dict[str, WarScore] = {}  # Contribution of each war, keys are in the format '#WARTAG#CLANTAG'
+        self.cwl_clan_scores: dict[str, WarScore] = {}  # Sum of the contributions of each clan
         self.ended_cwl_wars: dict[str, War] = {}
 
+    @single_flight
     async def get_current_war(self) -> Optional[War]:
-        if self.war_last_fetched_at is not None and time() - self.war_last_fetched_at < 3:
-            return self.current_war
+        # Responses are cached by the CoC API client for as long as the API allows (Cache-Control max-age)
         current_war = await self.coc_api_client.get_current_war(self.clan_tag)
         if current_war is not None:
             if self.on_current_war_change is not None and self.current_war != current_war:
                 await self.on_current_war_change(current_war)
+            if current_war.state == 'warEnded' and not current_war.is_cwl and current_war != self.current_war:
+                await self.wars_repository.insert_war(current_war)
             self.current_war = current_war
-            self.war_last_fetched_at = time()
             log('Succesfully fetched war', LogLevel.INFO)
             if self.war_fetch_next_task is not None:
                 self.war_fetch_next_task.cancel()
@@ -55,45 +59,84 @@ class ClanWarsService:
             self.war_fetch_next_task = event_loop.call_later(duration, self.create_next_war_fetch_task)
         return current_war
 
+    @single_flight
     async def get_current_cwl_group(self):
-        if self.cwl_last_fetched_at is not None and time() - self.cwl_last_fetched_at < 3:
-            return self.current_cwl_group
         league_group = await self.coc_api_client.get_current_leaguegroup(self.clan_tag)
         if league_group is not None:
             self.current_cwl_group = league_group
-            self.cwl_last_fetched_at = time()
             log('Succesfully fetched cwl group', LogLevel.INFO)
         else:
             return None
 
-        clan_scores = {c.tag: WarScore() for c in league_group.clans}
-        for ir in range(len(league_group.rounds)):
-            round = league_group.rounds[ir]
-            for war_tag in round.war_tags:
-                war = self.ended_cwl_wars.get(war_tag)
-                if war is None:
-                    war = await self.coc_api_client.get_cwl_war(war_tag)
-                    if war is not None:
-                        war.league_day = ir + 1
-                        if war.state == 'warEnded':
-                            self.ended_cwl_wars[war_tag] = war
-                        if war.state == 'inWar' and self.clan_tag in (war.clan.tag, war.opponent.tag):
-                            self.current_war = war
-                            self.war_last_fetched_at = time()
+        if league_group.season != self.cwl_season:
+            self.cwl_season = league_group.season
+            self.cwl_scores = {}
+            self.cwl_clan_scores = {}
+            self.ended_cwl_wars = {}
+        for clan in league_group.clans:
+            self.cwl_clan_scores.setdefault(clan.tag, WarScore())
 
-                if war is not None:
-                    clan_1_tag, clan_2_tag = war.clan.tag, war.opponent.tag
-                    clan_scores[clan_1_tag].add_to_score(war.clan)
-                    clan_scores[clan_2_tag].add_to_score(war.opponent)
-                    star_diff = war.clan.stars - war.opponent.stars
-                    percent_diff = war.clan.destruction_percentage - war.opponent.destruction_percentage
-                    if war.state == 'warEnded':
-                        if star_diff > 0 or star_diff == 0 and percent_diff > 0:
-                            clan_scores[clan_1_tag].stars += 10
-                        elif star_diff < 0 or star_diff == 0 and percent_diff < 0:
-                            clan_scores[clan_2_tag].stars += 10
-        league_group.clan_scores = clan_scores
+        # Ended wars can no longer change, only the other ones are fetched again
+        ended_rounds_count = self.get_ended_rounds_count(league_group)
+        pending_wars = [
+            (ir + 1, war_tag, ir < ended_rounds_count)
+            for ir, round in enumerate(league_group.rounds)
+            for war_tag in round.war_tags
+            if war_tag not in self.ended_cwl_wars
+        ]
+        semaphore = asyncio.Semaphore(CWL_WARS_CONCURRENCY)
+
+        async def fetch_cwl_war(war_tag: str, league_day: int, is_ended: bool) -> Optional[War]:
+            async with semaphore:
+                return await self.get_cwl_war(war_tag, league_day, is_ended)
+
+        wars = await asyncio.gather(*(
+            fetch_cwl_war(war_tag, league_day, is_ended) for league_day, war_tag, is_ended in pending_wars
+        ))
+        for (league_day, war_tag, _), war in zip(pending_wars, wars):
+            if war is None:
+                continue
+            if war.state == 'inWar' and self.clan_tag in (war.clan.tag, war.opponent.tag):
+                self.current_war = war
+            for war_clan in (war.clan, war.opponent):
+                score_key = f'{war_tag}{war_clan.tag}'
+                contribution = WarScore.from_war(war, war_clan)
+                clan_score = self.cwl_clan_scores.setdefault(war_clan.tag, WarScore())
+                clan_score.apply_delta(self.cwl_scores.get(score_key, WarScore()), contribution)
+                self.cwl_scores[score_key] = contribution
+        league_group.clan_scores = self.cwl_clan_scores
         return league_group
 
+    @staticmethod
+    def get_ended_rounds_count(league_group: CWLGroup) -> int:
+        # Only the last two rounds can still be in preparation or in war, until the league ends
+        if league_group.state == 'ended':
+            return len(league_group.rounds)
+        return max(0, len(league_group.rounds) - 2)
+
+    async def get_cwl_war(
+        self,
+        war_tag: str,
+        league_day: Optional[int] = None,
+        is_ended: bool = False
+    ) -> Optional[War]:
+        # Ended wars never change: they are read from memory, then from the archive, before calling the API.
+        # Only the wars known to be ended can be archived
+        war = self.ended_cwl_wars.get(war_tag)
+        if war is None and is_ended:
+            war = await self.wars_repository.get_cwl_war(war_tag)
+        is_archived = war is not None
+        if war is None:
+            war = await self.coc_api_client.get_cwl_war(war_tag)
+            if war is None:
+                return None
+        if league_day is not None:
+            war.league_day = league_day
+        if war.state == 'warEnded':
+            if not is_archived:
+                await self.wars_repository.insert_war(war)
+            self.ended_cwl_wars[war_tag] = war
+        return war
+
     def create_next_war_fetch_task(self):
-        asyncio.create_task(self.get_current_war())
+        create_background_task(self.get_current_war())
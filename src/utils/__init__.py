@@ -1,4 +1,8 @@
 from .logger import log, LogLevel
+from .priority import RequestPriority, request_priority, create_background_task
+from .single_flight import single_flight
+from .json_codec import json_loads, json_dumps
+from .rolling_histogram import RollingHistogram
 from datetime import datetime, timezone
 from i18n import __
 
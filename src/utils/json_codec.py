@@ -0,0 +1,76 @@
+import json
+import os
+from typing import Any, Optional
+
+
+class JsonCodec:
+    name = 'json'
+
+    def loads(self, data: str | bytes) -> Any:
+        return json.loads(data)
+
+    def dumps(self, obj: Any) -> str:
+        return json.dumps(obj)
+
+
+class OrjsonCodec(JsonCodec):
+    name = 'orjson'
+
+    def __init__(self) -> None:
+        import orjson  # type: ignore
+        self.orjson = orjson
+
+    def loads(self, data: str | bytes) -> Any:
+        return self.orjson.loads(data)
+
+    def dumps(self, obj: Any) -> str:
+        return self.orjson.dumps(obj).decode()
+
+
+class MsgspecCodec(JsonCodec):
+    name = 'msgspec'
+
+    def __init__(self) -> None:
+        import msgspec  # type: ignore
+        self.decoder = msgspec.json.Decoder()
+        self.encoder = msgspec.json.Encoder()
+
+    def loads(self, data: str | bytes) -> Any:
+        return self.decoder.decode(data)
+
+    def dumps(self, obj: Any) -> str:
+        return self.encoder.encode(obj).decode()
+
+
+CODECS: dict[str, type[JsonCodec]] = {
+    'orjson': OrjsonCodec,
+    'msgspec': MsgspecCodec,
+    'json': JsonCodec,
+}
+
+
+def create_json_codec(name: Optional[str] = None) -> JsonCodec:
+    # Uses the given codec, or the fastest one installed
+    names = [name] if name in CODECS else list(CODECS)
+    for codec_name in names:
+        try:
+            return CODECS[codec_name]()
+        except ImportError:
+            continue
+    return JsonCodec()
+
+
+json_codec = create_json_codec(os.environ.get('JSON_CODEC'))
+
+
+def set_json_codec(name: str) -> None:
+    global json_codec
+    json_codec = create_json_codec(name)
+
+
+def json_loads(data: str | bytes) -> Any:
+    return json_codec.loads(data)
+
+
+def json_dumps(obj: Any) -> str:
+    return json_codec.dumps(obj)
@@ -0,0 +1,22 @@
+import asyncio
+import contextvars
+from enum import Enum
+from typing import Coroutine
+
+
+class RequestPriority(Enum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+# Requests are interactive unless they are issued from a task created with create_background_task
+request_priority: contextvars.ContextVar[RequestPriority] = contextvars.ContextVar(
+    'request_priority',
+    default=RequestPriority.INTERACTIVE
+)
+
+
+def create_background_task(coroutine: Coroutine) -> asyncio.Task:
+    context = contextvars.copy_context()
+    context.run(request_priority.set, RequestPriority.BACKGROUND)
+    return asyncio.create_task(coroutine, context=context)
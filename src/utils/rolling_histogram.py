@@ -0,0 +1,41 @@
+from collections import deque
+from typing import Optional
+
+
+DEFAULT_WINDOW_SIZE = 100
+DEFAULT_BUCKETS = (50, 100, 250, 500, 1000)
+
+
+class RollingHistogram:
+    # Keeps the last values only, bucketed by upper bound (the last bucket has no bound)
+    def __init__(self, window_size: int = DEFAULT_WINDOW_SIZE, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.values: deque[float] = deque(maxlen=window_size)
+        self.buckets = buckets
+
+    def add(self, value: float) -> None:
+        self.values.append(value)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self.values) == 0:
+            return None
+        sorted_values = sorted(self.values)
+        return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+    def get_stats(self) -> dict:
+        counts = [0] * (len(self.buckets) + 1)
+        for value in self.values:
+            counts[next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))] += 1
+        return {
+            'count': len(self.values),
+            'last': self.values[-1] if len(self.values) > 0 else None,
+            'min': min(self.values, default=None),
+            'max': max(self.values, default=None),
+            'mean': sum(self.values) / len(self.values) if len(self.values) > 0 else None,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'histogram': {
+                **{f'<={bound}': count for bound, count in zip(self.buckets, counts)},
+                f'>{self.buckets[-1]}': counts[-1]
+            }
+        }
@@ -0,0 +1,39 @@
+import asyncio
+from functools import wraps
+from typing import Any, Awaitable, Callable, TypeVar, cast
+
+from .priority import request_priority
+
+
+F = TypeVar('F', bound=Callable[..., Awaitable[Any]])
+
+
+def single_flight(func: F) -> F:
+    # Concurrent calls on the same instance with the same arguments await one shared call. The shared call runs with
+    # the request priority of the caller that started it, so callers of another priority don't join it
+    in_flight: dict[tuple, asyncio.Future] = {}
+    waiter_counts: dict[tuple, int] = {}
+
+    def forget(key: tuple) -> None:
+        in_flight.pop(key, None)
+        waiter_counts.pop(key, None)
+
+    @wraps(func)
+    async def wrapper(self, *args):
+        key = (self, *args, request_priority.get())
+        future = in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func(self, *args))
+            in_flight[key] = future
+            waiter_counts[key] = 0
+            future.add_done_callback(lambda _: forget(key))
+        waiter_counts[key] += 1
+        try:
+            # Shielded so that a cancelled caller does not cancel the call shared with the others
+            return await asyncio.shield(future)
+        finally:
+            if not future.done():  # The caller was cancelled
+                waiter_counts[key] -= 1
+                if waiter_counts[key] == 0:
+                    future.cancel()  # Nobody waits for the result anymore
+    return cast(F, wrapper)